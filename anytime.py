@@ -0,0 +1,125 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import logging
+import os
+import threading
+import time
+
+import bot
+import geometry
+from state import Move, MoveType
+
+
+# Seconds allowed per round, counted from when the round number was read.
+# Set WORMS_BUDGET=0 to call get_move directly with no deadline.
+BUDGET = float(os.environ.get("WORMS_BUDGET", "0.8"))
+
+# Seconds before the deadline get_move's own searches are told to stop, to
+# leave time for returning the move
+MARGIN = 0.02
+
+rounds = 0
+deadlines_hit = 0
+
+# Search threads can't be stopped, so a late one is left to finish on its own
+_late = None
+
+
+class _Search(threading.Thread):
+
+    def __init__(self, module, state, deadline):
+        super().__init__(daemon=True)
+        self.module = module
+        self.state = state
+        self.deadline = deadline
+        self.move = None
+
+    def run(self):
+        try:
+            self.move = self.module.get_move(self.state, self.deadline)
+        except Exception as e:
+            logging.exception(e)
+
+
+def fallback_move(state):
+    # Cheap move for when get_move runs out of time: get off hot cells, shoot
+    # whatever is in range, otherwise dig or head for the centre. Moves onto
+    # cells an opponent could hit and digs that open a line to us are only
+    # chosen if nothing else is left. Doing nothing is the last resort since
+    # the engine limits do-nothings.
+    moves = bot.valid_moves(state)
+    hot = bot.hot_cells(state)
+    on_hot = state.current_worm.position in hot
+
+    if not on_hot and bot.can_shoot(state):
+        return bot.shoot_lowest_health(state)
+
+    danger = bot.dangerous_cells(state)
+    safe = ([m for m in bot.filter_type(moves, MoveType.MOVE)
+             if m.target not in danger] +
+            bot.exclude_dangerous_digging(
+                state, bot.filter_type(moves, MoveType.DIG)))
+
+    centre_d2 = geometry.for_state(state).centre_d2
+    for options in (safe, moves):
+        cold = [m for m in options if m.target not in hot]
+        if not on_hot:
+            digs = bot.filter_type(cold, MoveType.DIG)
+            if digs:
+                return digs[0]
+
+        move_only = (bot.filter_type(cold, MoveType.MOVE) or
+                     bot.filter_type(options, MoveType.MOVE))
+        if move_only:
+            return min(move_only, key=lambda m: centre_d2[m.target])
+
+        digs = bot.filter_type(options, MoveType.DIG)
+        if digs:
+            return digs[0]
+    return Move(MoveType.NOTHING)
+
+
+def searching():
+    # Whether a search that missed its deadline is still using its state
+    return _late is not None and _late.is_alive()
+
+
+def get_move(state, start=None, budget=BUDGET, module=bot):
+    # Best move found before start + budget: get_move's if it finishes in
+    # time, the fallback move otherwise
+    global rounds, deadlines_hit, _late
+
+    if start is None:
+        start = time.perf_counter()
+    rounds += 1
+
+    if budget <= 0:
+        return module.get_move(state)
+
+    if _late is not None:
+        if _late.is_alive():
+            logging.warning("Search from round %d is still running",
+                            _late.state.round)
+        else:
+            _late = None
+
+    move = fallback_move(state)
+
+    deadline = start + budget
+    search = _Search(module, state, deadline - MARGIN)
+    search.start()
+    search.join(max(0, deadline - time.perf_counter()))
+
+    if search.is_alive():
+        deadlines_hit += 1
+        _late = search
+        logging.warning("Deadline hit in round %d (%d of %d rounds), "
+                        "using fallback move", state.round, deadlines_hit,
+                        rounds)
+    elif search.move is not None:
+        move = search.move
+
+    return move
@@ -0,0 +1,131 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import threading
+from collections import OrderedDict
+
+
+# Weights are 1 / r² in fixed point. Integer sums are exact, so a field
+# updated cell by cell always equals one built from scratch.
+SCALE = 1 << 40
+
+# Bits per cell in a packed field; a cell's sum stays below 2^52
+WIDTH = 64
+
+FIELD_CAPACITY = 4
+
+_kernels = dict()
+
+# Recent fields by map size, newest last; a new mask starts from whichever
+# differs from it in the fewest cells
+_fields = dict()
+_lock = threading.Lock()
+
+
+class _Kernel:
+
+    # A field is one int holding WIDTH bits per cell, with rows
+    # stride = 2 * size - 1 cells apart. The columns past size are padding:
+    # the weights a stamp spills off either side of the map land there
+    # instead of in the next row. Stamping a cell is one shift of the
+    # kernel, the weights of a cell in the middle of a double-size map.
+
+    def __init__(self, size):
+        self.size = size
+        self.stride = stride = 2 * size - 1
+        weights = bytearray()
+        for dy in range(1 - size, size):
+            for dx in range(1 - size, size):
+                d2 = dx * dx + dy * dy
+                weights += (SCALE // d2 if d2 else 0).to_bytes(WIDTH // 8,
+                                                               "little")
+        self.weights = int.from_bytes(weights, "little")
+        self.centre = (size - 1) * stride + (size - 1)
+        self.region = (1 << (WIDTH * size * stride)) - 1
+
+    def stamp(self, i):
+        # The kernel moved so its centre sits on cell i
+        y, x = divmod(i, self.size)
+        shift = WIDTH * (y * self.stride + x - self.centre)
+        if shift >= 0:
+            return self.weights << shift
+        return self.weights >> -shift
+
+
+class Field:
+
+    # Sum of SCALE / r² over every cell of mask, at every cell of the map
+    # (the cell itself counts 0). Never changed once built.
+
+    def __init__(self, mask, packed, kernel):
+        self.mask = mask
+        self.packed = packed
+        self.stride = kernel.stride
+        self._bytes = None
+
+    def __getitem__(self, pos):
+        if self._bytes is None:
+            self._bytes = self.packed.to_bytes(
+                (self.packed.bit_length() + 7) // 8 + WIDTH // 8, "little")
+        x, y = pos
+        start = (y * self.stride + x) * (WIDTH // 8)
+        return (int.from_bytes(self._bytes[start:start + WIDTH // 8], "little")
+                / SCALE)
+
+
+def _kernel(size):
+    if size not in _kernels:
+        _kernels[size] = _Kernel(size)
+    return _kernels[size]
+
+
+def _bits(mask):
+    digits = format(mask, "b")[::-1]
+    i = digits.find("1")
+    while i >= 0:
+        yield i
+        i = digits.find("1", i + 1)
+
+
+def _count(mask):
+    return bin(mask).count("1")
+
+
+def _field(size, mask):
+    kernel = _kernel(size)
+    with _lock:
+        recent = list(_fields.get(size, dict()).values())
+    old = min(recent, key=lambda f: _count(f.mask ^ mask), default=None)
+    if old is not None and old.mask == mask:
+        return old
+
+    # Every cell's sum only ever holds stamps of cells still in the mask, so
+    # it never goes negative and nothing borrows from the next cell
+    if old is not None and _count(old.mask ^ mask) < _count(mask):
+        packed = old.packed
+        for i in _bits(old.mask & ~mask):
+            packed -= kernel.stamp(i)
+        for i in _bits(mask & ~old.mask):
+            packed += kernel.stamp(i)
+    else:
+        packed = 0
+        for i in _bits(mask):
+            packed += kernel.stamp(i)
+    packed &= kernel.region
+
+    field = Field(mask, packed, kernel)
+    with _lock:
+        fields = _fields.setdefault(size, OrderedDict())
+        fields[mask] = field
+        fields.move_to_end(mask)
+        while len(fields) > FIELD_CAPACITY:
+            fields.popitem(last=False)
+    return field
+
+
+def for_mask(state, mask):
+    # Attraction towards the cells of a bitset, e.g. the dirt worth digging
+    return state.analysis.get(("attraction", mask),
+                              lambda: _field(state.grid.size, mask))
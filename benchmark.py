@@ -0,0 +1,553 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import argparse
+import gc
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+import bitboard
+import history
+import interface
+import lava
+import stats
+from state import State
+
+
+PHASES = ("parse", "history", "move", "total")
+
+# Stats compared between runs; the median is left out because it hides the
+# rounds that actually run into the time limit
+COMPARED = ("mean", "p95", "p99", "max")
+
+
+class BranchRecorder(logging.Handler):
+
+    # Remembers the last decision get_move logged. Only the format string is
+    # kept, so e.g. every "Selecting! Move: %s" lands in the same branch.
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.last = None
+
+    def emit(self, record):
+        if record.module == "bot" and record.funcName in ("get_move",
+                                                          "choose_move",
+                                                          "run_away"):
+            self.last = record.msg
+
+
+class GcTimer:
+
+    # Adds up the garbage collector's pauses, for gc.callbacks
+
+    def __init__(self):
+        self.started = None
+        self.elapsed = 0
+        self.collections = 0
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            self.elapsed += time.perf_counter() - self.started
+            self.collections += 1
+            self.started = None
+
+    def reset(self):
+        self.elapsed = 0
+        self.collections = 0
+
+
+def find_matches(paths):
+    # A match is a directory of rounds/<n>/state.json, as written by the
+    # engine or simulator.py --save. Directories holding several matches are
+    # searched recursively.
+    matches = defaultdict(list)
+    for path in paths:
+        for state_file in Path(path).rglob("state.json"):
+            round_dir = state_file.parent
+            if round_dir.name.isdigit():
+                matches[round_dir.parent].append(round_dir)
+    return {match: sorted(rounds, key=lambda p: int(p.name))
+            for match, rounds in sorted(matches.items())}
+
+
+def replay(match_rounds, module, recorder, seed=0, instrument=None,
+           speculator=None, gc_timer=None):
+    # Play through a match the way main.run_bot does. With a gc_timer, the
+    # bytes allocated (tracemalloc must be running) and the garbage
+    # collector's pauses are recorded for each round.
+    random.seed(seed)
+    last_state = None
+    last_move = None
+    previous = None
+    records = []
+
+    for round_dir in match_rounds:
+        if gc_timer is not None:
+            gc_timer.reset()
+            tracemalloc.reset_peak()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        state = interface.load_path(round_dir / "state.json", last_state)
+        parsed = time.perf_counter()
+        previous = history.calculate(last_state, state, last_move, previous)
+        history.update_state(state, previous)
+        updated = time.perf_counter()
+
+        recorder.last = None
+        if speculator is not None:
+            speculated = speculator.adopt(state)
+        move = module.get_move(state)
+        done = time.perf_counter()
+
+        records.append({
+            "path": str(round_dir),
+            "round": state.round,
+            "parse": parsed - start,
+            "history": updated - parsed,
+            "move": done - updated,
+            "total": done - start,
+            "branch": recorder.last,
+            "output": interface.move_to_string(move),
+        })
+        if gc_timer is not None:
+            records[-1]["allocated"] = (tracemalloc.get_traced_memory()[1]
+                                        - allocated_before)
+            records[-1]["gc"] = gc_timer.elapsed
+            records[-1]["collections"] = gc_timer.collections
+        if speculator is not None:
+            records[-1]["speculated"] = speculated
+            # As if the bot had the whole wait for the next round
+            speculator.run(state, move)
+        if instrument is not None:
+            # Stage and helper timings from inside get_move
+            records[-1]["stage"] = instrument.last["branch"]
+            records[-1]["stages"] = instrument.last["stages"]
+            records[-1]["calls"] = instrument.last["calls"]
+        last_state = state
+        last_move = move
+
+    return records
+
+
+def summarise(records):
+    phases = {phase: stats.summary([r[phase] for r in records])
+              for phase in PHASES}
+
+    by_branch = defaultdict(list)
+    for record in records:
+        by_branch[record["branch"] or "?"].append(record["move"])
+    branches = {branch: stats.summary(times)
+                for branch, times in sorted(by_branch.items())}
+    result = {"phases": phases, "branches": branches}
+
+    if all("stages" in r for r in records):
+        stages = defaultdict(list)
+        helpers = defaultdict(list)
+        for record in records:
+            for name, elapsed in record["stages"].items():
+                stages[name].append(elapsed)
+            for name, call in record["calls"].items():
+                helpers[name].append(call["time"])
+        result["stages"] = {name: stats.summary(times)
+                            for name, times in stages.items()}
+        result["helpers"] = {name: stats.summary(times)
+                             for name, times in sorted(helpers.items())}
+
+    if all("allocated" in r for r in records):
+        result["memory"] = {
+            "allocated": stats.summary([r["allocated"] for r in records]),
+            "gc": stats.summary([r["gc"] for r in records]),
+            "collections": sum(r["collections"] for r in records),
+        }
+
+    return result
+
+
+def run(paths, module_name, slowest, instrumented=False, speculating=False,
+        memory=False, search_mode=""):
+    instrument = None
+    if instrumented:
+        # Has to be switched on before the bot is imported
+        os.environ["WORMS_INSTRUMENT"] = "1"
+        instrument = importlib.import_module("instrument")
+        instrument.output_path = ""
+    if search_mode:
+        os.environ["WORMS_SEARCH"] = search_mode
+    module = importlib.import_module(module_name)
+    speculate = importlib.import_module("speculate")
+    search = importlib.import_module("search")
+    endgame = importlib.import_module("endgame")
+
+    # Route bot logging to the branch recorder only
+    recorder = BranchRecorder()
+    root = logging.getLogger()
+    root.handlers = [recorder]
+    root.setLevel(logging.INFO)
+
+    gc_timer = None
+    if memory:
+        gc_timer = GcTimer()
+        gc.callbacks.append(gc_timer)
+        tracemalloc.start()
+
+    matches = find_matches(paths)
+    records = []
+    try:
+        for i, (match, match_rounds) in enumerate(matches.items()):
+            print(f"{match}: {len(match_rounds)} rounds", file=sys.stderr)
+            speculator = speculate.Speculator() if speculating else None
+            records += replay(match_rounds, module, recorder, seed=i,
+                              instrument=instrument, speculator=speculator,
+                              gc_timer=gc_timer)
+        # Whatever the bot's caches still hold after every match
+        retained = tracemalloc.get_traced_memory()[0] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+            gc.callbacks.remove(gc_timer)
+
+    result = summarise(records)
+    if memory:
+        result["memory"]["retained"] = retained
+    result["bot"] = module_name
+    result["matches"] = len(matches)
+    if speculating:
+        result["speculated"] = sum(r["speculated"] for r in records)
+    if search.MODE:
+        result["search"] = {"mode": search.MODE, "nodes": search.nodes,
+                            "seconds": search.seconds,
+                            "changed": search.changed}
+    if endgame.solves:
+        result["endgame"] = {"solves": endgame.solves, "nodes": endgame.nodes,
+                             "seconds": endgame.seconds,
+                             "depths": endgame.depths}
+    result["slowest"] = sorted(records, key=lambda r: r["total"],
+                               reverse=True)[:slowest]
+    result["rounds"] = records
+    return result
+
+
+def _loaders():
+    # Each takes the file text and the previous round's state
+    loaders = {
+        "json": lambda text, previous: State(json.loads(text)),
+        "stream": lambda text, previous: State(interface.parse_state(text)),
+        "stream+previous": lambda text, previous: State(
+            interface.parse_state(text), previous),
+    }
+    try:
+        import orjson
+        loaders["orjson"] = lambda text, previous: State(orjson.loads(text))
+    except ImportError:
+        pass
+    return loaders
+
+
+def time_loaders(paths, repeat):
+    # Parse and build every recorded state with each loader. File reading
+    # isn't timed, so only parsing and construction are compared.
+    times = defaultdict(list)
+    for match_rounds in find_matches(paths).values():
+        previous = None
+        for round_dir in match_rounds:
+            text = (round_dir / "state.json").read_text()
+            for name, loader in _loaders().items():
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    state = loader(text, previous)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                times[name].append(best)
+            previous = state
+    return {name: stats.summary(values) for name, values in times.items()}
+
+
+def check_lava(paths, ahead):
+    # Checks lava.Schedule against the lava in recorded rounds: each round's
+    # own lava, and the prediction for up to ahead rounds later against the
+    # round recorded then. Only rounds written by the game engine test the
+    # schedule; the simulator spreads lava with the same formula.
+    logging.getLogger().setLevel(logging.ERROR)
+    rounds = wrong = predicted = mispredicted = 0
+    for match_rounds in find_matches(paths).values():
+        states = dict()
+        for round_dir in match_rounds:
+            state = interface.load_path(round_dir / "state.json")
+            states[state.round] = state
+        for number, state in sorted(states.items()):
+            schedule = lava.for_state(state)
+            rounds += 1
+            if schedule.lava(number) != bitboard.for_state(state).lava:
+                wrong += 1
+                print(f"{match_rounds[0].parent} round {number}: lava "
+                      f"doesn't follow the schedule")
+            for k in range(1, ahead + 1):
+                later = states.get(number + k)
+                if later is None:
+                    continue
+                predicted += 1
+                if schedule.lava(number + k) != bitboard.for_state(later).lava:
+                    mispredicted += 1
+    print(f"{wrong} of {rounds} rounds differ from the schedule; "
+          f"{mispredicted} of {predicted} predictions up to {ahead} rounds "
+          f"ahead were wrong")
+    return wrong + mispredicted
+
+
+def time_rollout(paths, playouts):
+    # The rollout policy against get_move on every recorded round: how long
+    # each takes to decide, how often they agree and how long playouts from
+    # the round take. The policy goes first, so it never sees get_move's
+    # analysis.
+    bot = importlib.import_module("bot")
+    rollout = importlib.import_module("rollout")
+    logging.getLogger().setLevel(logging.WARNING)
+    times = defaultdict(list)
+    rounds = same = same_type = 0
+    for match_rounds in find_matches(paths).values():
+        random.seed(0)
+        last_state = last_move = previous = None
+        for round_dir in match_rounds:
+            state = interface.load_path(round_dir / "state.json", last_state)
+            previous = history.calculate(last_state, state, last_move,
+                                         previous)
+            history.update_state(state, previous)
+
+            # Built once per map layout, so not part of a decision
+            rollout.for_state(state)
+            start = time.perf_counter()
+            code = rollout.policy(state)
+            times["policy"].append(time.perf_counter() - start)
+            for _ in range(playouts):
+                start = time.perf_counter()
+                rollout.playout(state)
+                times["playout"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            move = bot.get_move(state)
+            times["get_move"].append(time.perf_counter() - start)
+
+            rounds += 1
+            same += code == move.code()
+            same_type += code & 7 == move.code() & 7
+            last_state = state
+            last_move = move
+
+    _table("decision (ms)", {name: stats.summary(values)
+                             for name, values in times.items()})
+    policy = stats.summary(times["policy"])["mean"]
+    get_move = stats.summary(times["get_move"])["mean"]
+    print(f"\npolicy is {get_move / policy:.0f}x faster than get_move on "
+          f"average; same command in {same} of {rounds} rounds, same type "
+          f"in {same_type}")
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.2f}"
+
+
+def _table(title, summaries):
+    width = max(len(name) for name in [title, *summaries])
+    print(f"{title:<{width}} {'count':>6} {'mean':>8} {'p95':>8} {'p99':>8} "
+          f"{'max':>8}")
+    for name, summary in summaries.items():
+        print(f"{name:<{width}} {summary['count']:>6} "
+              + " ".join(f"{_ms(summary.get(s)):>8}" for s in COMPARED))
+
+
+def report(result):
+    print(f"{result['bot']}: {len(result['rounds'])} rounds from "
+          f"{result['matches']} matches (ms)")
+    if "speculated" in result:
+        print(f"speculation matched {result['speculated']} rounds")
+    if "search" in result:
+        search = result["search"]
+        rate = search["nodes"] / search["seconds"] if search["seconds"] else 0
+        print(f"{search['mode']} search: {search['nodes']} nodes in "
+              f"{search['seconds']:.2f} s ({rate:.0f} nodes/s), changed "
+              f"{search['changed']} moves")
+    if "endgame" in result:
+        endgame = result["endgame"]
+        rate = (endgame["nodes"] / endgame["seconds"]
+                if endgame["seconds"] else 0)
+        print(f"endgame: {endgame['solves']} solves to a mean depth of "
+              f"{endgame['depths'] / endgame['solves']:.1f}, "
+              f"{endgame['nodes']} nodes ({rate:.0f} nodes/s)")
+    _table("phase", result["phases"])
+    print()
+    _table("get_move by branch", result["branches"])
+    print()
+    if "memory" in result:
+        memory = result["memory"]
+        allocated = memory["allocated"]
+        print(f"allocated per round (KB): mean "
+              f"{allocated['mean'] / 1024:.1f}, p95 "
+              f"{allocated['p95'] / 1024:.1f}, max "
+              f"{allocated['max'] / 1024:.1f}; retained after all matches "
+              f"{memory['retained'] / 1024:.0f} KB")
+        print(f"{memory['collections']} garbage collections")
+        _table("gc pause per round", {"gc": memory["gc"]})
+        print()
+    if "stages" in result:
+        _table("get_move stage", result["stages"])
+        print()
+        _table("helper time per round", result["helpers"])
+        print()
+    print("slowest rounds:")
+    for record in result["slowest"]:
+        print(f"  {_ms(record['total']):>8}  {record['path']}  "
+              f"{record['branch']}")
+
+
+def compare(base, new, threshold, min_delta, min_count):
+    # A stat regresses when it is both threshold percent and min_delta
+    # seconds slower than the base run. Branches taken fewer than min_count
+    # times are too noisy to judge.
+    regressions = []
+    rows = [("phase", name, base["phases"][name], new["phases"][name])
+            for name in PHASES]
+    rows += [("branch", name, base["branches"][name], new["branches"][name])
+             for name in new["branches"] if name in base["branches"]]
+
+    for kind, name, before, after in rows:
+        if min(before["count"], after["count"]) < max(min_count, 1):
+            continue
+        for stat in COMPARED:
+            delta = after[stat] - before[stat]
+            if (delta > min_delta and
+                    after[stat] > before[stat] * (1 + threshold / 100)):
+                regressions.append((kind, name, stat, before[stat],
+                                    after[stat]))
+    return regressions
+
+
+def changed_moves(base, new):
+    # Rounds where the two runs chose differently
+    before = {r["path"]: r for r in base["rounds"]}
+    return [(r["path"], before[r["path"]]["output"], r["output"])
+            for r in new["rounds"]
+            if r["path"] in before and before[r["path"]]["output"] != r["output"]]
+
+
+def print_comparison(base, new, threshold, min_delta, min_count):
+    print(f"{'':<57} {'base':>8} {'new':>8} {'change':>8}")
+    for kind, table in (("phase", "phases"), ("branch", "branches")):
+        for name, after in new[table].items():
+            before = base[table].get(name)
+            if before is None or not before["count"] or not after["count"]:
+                continue
+            for stat in COMPARED:
+                change = (after[stat] / before[stat] - 1) * 100
+                print(f"{kind:<6} {name:<42} {stat:<7} "
+                      f"{_ms(before[stat]):>8} {_ms(after[stat]):>8} "
+                      f"{change:>+7.1f}%")
+
+    changed = changed_moves(base, new)
+    if changed:
+        print(f"\n{len(changed)} rounds chose a different move")
+
+    regressions = compare(base, new, threshold, min_delta, min_count)
+    print()
+    for kind, name, stat, before, after in regressions:
+        print(f"REGRESSION {kind} {name} {stat}: {_ms(before)} -> "
+              f"{_ms(after)} ms")
+    print(f"{len(regressions)} regressions")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the bot over recorded rounds")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="replay a corpus")
+    run_parser.add_argument("paths", nargs="+",
+                            help="rounds directories, or directories of them")
+    run_parser.add_argument("--bot", default="bot", help="module to time")
+    run_parser.add_argument("--out", help="save the results as JSON")
+    run_parser.add_argument("--slowest", type=int, default=10)
+    run_parser.add_argument("--instrument", action="store_true",
+                            help="also time get_move's stages and helpers")
+    run_parser.add_argument("--speculate", action="store_true",
+                            help="precompute between rounds, included in "
+                                 "the move time only when it is adopted")
+    run_parser.add_argument("--memory", action="store_true",
+                            help="also record allocations and garbage "
+                                 "collector pauses (tracing slows every "
+                                 "phase down)")
+    run_parser.add_argument("--search", default="",
+                            choices=["", "maximin", "mixed"],
+                            help="check get_move's choices with a payoff "
+                                 "matrix search")
+
+    compare_parser = subparsers.add_parser("compare",
+                                           help="compare two saved runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=20,
+                                help="percent slowdown that counts")
+    compare_parser.add_argument("--min-delta", type=float, default=1,
+                                help="milliseconds slowdown that counts")
+    compare_parser.add_argument("--min-count", type=int, default=30,
+                                help="fewest rounds a branch needs to be "
+                                     "compared")
+
+    parse_parser = subparsers.add_parser(
+        "parse", help="compare state loaders on a corpus")
+    parse_parser.add_argument("paths", nargs="+")
+    parse_parser.add_argument("--repeat", type=int, default=3,
+                              help="best of this many per file")
+
+    rollout_parser = subparsers.add_parser(
+        "rollout", help="compare the rollout policy with get_move")
+    rollout_parser.add_argument("paths", nargs="+")
+    rollout_parser.add_argument("--playouts", type=int, default=1,
+                                help="playouts timed from each round")
+
+    lava_parser = subparsers.add_parser(
+        "lava", help="check the lava schedule against recorded rounds")
+    lava_parser.add_argument("paths", nargs="+",
+                             help="rounds recorded by the game engine")
+    lava_parser.add_argument("--ahead", type=int, default=5,
+                             help="rounds ahead to check predictions for")
+
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        _table("loader (ms)", time_loaders(args.paths, args.repeat))
+    elif args.command == "lava":
+        sys.exit(1 if check_lava(args.paths, args.ahead) else 0)
+    elif args.command == "rollout":
+        time_rollout(args.paths, args.playouts)
+    elif args.command == "run":
+        result = run(args.paths, args.bot, args.slowest, args.instrument,
+                     args.speculate, args.memory, args.search)
+        report(result)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(result, f)
+    else:
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = print_comparison(base, new, args.threshold,
+                                       args.min_delta / 1000, args.min_count)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from bisect import bisect_left
+
+from state import DIRT, AIR, LAVA, Player
+import geometry
+
+
+def _one_hot(*codes):
+    # Translation table turning cell codes into "1" for codes, "0" otherwise
+    return bytes(ord("1") if code in codes else ord("0") for code in range(256))
+
+
+_DIRT = _one_hot(DIRT)
+_AIR = _one_hot(AIR)
+_LAVA = _one_hot(LAVA)
+_SET = _one_hot(*range(1, 256))
+
+
+def _bits(array, table):
+    # Bit i is set if array[i] translates to "1"; the string is reversed so
+    # index 0 ends up as the lowest bit
+    return int(array.translate(table)[::-1], 2)
+
+
+class Bitboards:
+
+    # The map as int bitsets, with bit y * size + x standing for cell (x, y).
+    # Ints are immutable, so copying is free and key() hashes the whole map.
+
+    def __init__(self, state):
+        grid = state.grid
+        self.size = grid.size
+        self.dirt = _bits(grid.types, _DIRT)
+        self.air = _bits(grid.types, _AIR)
+        self.lava = _bits(grid.types, _LAVA)
+        self.powerups = _bits(grid.powerups, _SET)
+        self.occupied = _bits(grid.worms, _SET)
+
+        self.own = 0
+        self.opponent = 0
+        for worm in state.own_worms + state.opponent_worms:
+            if worm.alive:
+                bit = 1 << grid.index(worm.position)
+                if worm.player == Player.SELF:
+                    self.own |= bit
+                else:
+                    self.opponent |= bit
+
+        # Cells that stop a shot: anything but air, and any worm
+        self.blocking = (geometry.for_state(state).in_map_mask & ~self.air
+                         | self.occupied)
+
+    def key(self):
+        return (self.dirt, self.air, self.lava, self.powerups, self.occupied)
+
+
+class CellSet:
+
+    # Read-only set of positions backed by a bitset, for membership tests
+    # without building a set of tuples
+
+    def __init__(self, bits, grid):
+        self.bits = bits
+        self.size = grid.size
+        self.all_positions = grid.all_positions
+
+    def __contains__(self, pos):
+        # Anything that isn't a position (e.g. a shot's direction) isn't in it
+        if not isinstance(pos, tuple):
+            return False
+        x, y = pos
+        return (0 <= x < self.size and 0 <= y < self.size and
+                (self.bits >> (y * self.size + x)) & 1 == 1)
+
+    def __iter__(self):
+        return iter(positions(self.bits, self.all_positions))
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+
+def for_state(state):
+    return state.analysis.get(("bitboards",), lambda: Bitboards(state))
+
+
+def first_blocker(mask, blocking, increasing):
+    # Index of the first blocking cell along a ray, or -1
+    hits = mask & blocking
+    if not hits:
+        return -1
+    if increasing:
+        return (hits & -hits).bit_length() - 1
+    return hits.bit_length() - 1
+
+
+def positions(bits, all_positions):
+    # Cells of a bitset, in map order
+    found = []
+    digits = format(bits, "b")[::-1]
+    i = digits.find("1")
+    while i >= 0:
+        found.append(all_positions[i])
+        i = digits.find("1", i + 1)
+    return found
+
+
+def closer_than(geo, d2):
+    # Cells whose squared distance to the centre is below d2
+    i = bisect_left(geo.d2_values, d2)
+    return geo.d2_masks[i - 1] if i > 0 else 0
+
+
+def nearest_d2(geo, bits):
+    # Smallest squared distance to the centre of any cell in bits, or None
+    if not bits & geo.in_map_mask:
+        return None
+    low, high = 0, len(geo.d2_values) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if bits & geo.d2_masks[middle]:
+            high = middle
+        else:
+            low = middle + 1
+    return geo.d2_values[low]
+
+
+def dilate(geo, bits):
+    # bits plus every in-map cell next to one
+    size = geo.size
+    left = bits & geo.not_left_edge
+    right = bits & geo.not_right_edge
+    row = bits | (left >> 1) | (right << 1)
+    return (row | (row >> size) | (row << size)) & geo.in_map_mask
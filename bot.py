@@ -9,234 +9,129 @@ import math
 import operator
 from collections import defaultdict
 
-from state import MoveType, CellType, Direction, Player, Move
-
-DELTAS = {
-    Direction.NW: (-1, -1),
-    Direction.N: (0, -1),
-    Direction.NE: (1, -1),
-    Direction.W: (-1, 0),
-    Direction.E: (1, 0),
-    Direction.SW: (-1, 1),
-    Direction.S: (0, 1),
-    Direction.SE: (1, 1),
-}
-
-BANANA_DAMAGE = {
-    (-2, 0): 7,
-    (-1, -1): 11,
-    (-1, 0): 13,
-    (-1, 1): 11,
-    (0, -2): 7,
-    (0, -1): 13,
-    (0, 0): 20,
-    (0, 1): 13,
-    (0, 2): 7,
-    (1, -1): 11,
-    (1, 0): 13,
-    (1, 1): 11,
-    (2, 0): 7,
-}
-
-SNOWBALL_DELTAS = [
-    (-1, -1),
-    (-1, 0),
-    (-1, 1),
-    (0, -1),
-    (0, 0),
-    (0, 1),
-    (1, -1),
-    (1, 0),
-    (1, 1),
-]
-
-
-CENTRE = (16, 16)
+from state import MoveType, Player, Move, AIR, worm_slot
+from rules import DELTAS, BANANA_DAMAGE, CENTRE
+from targeting import Targets
+import attraction
+import bitboard
+import candidates
+import endgame
+import geometry
+import instrument
+import lava
+import pathfind
+import search
+import threat
+
+
 DAMAGE_MIN = 20
 BANANA_DIG_MINIMUM = 8
 MAX_DO_NOTHINGS = 11
+SEARCH_MODE = search.MODE
+ENDGAME = endgame.ENABLED
 
 
+@instrument.timed
 def valid_moves(state, subject=None, include_lava=False):
     if subject is None:
         subject = state.current_worm
 
-    moves = [Move(MoveType.NOTHING)]
-    for dx, dy in DELTAS.values():
-        x = subject.x + dx
-        y = subject.y + dy
-        if (x, y) in state.map:
-            cell = state.map[(x, y)]
-            if cell.type == CellType.DIRT:
-                moves.append(Move(MoveType.DIG, (x, y)))
-            elif cell.type == CellType.AIR or (include_lava and
-                                               cell.type == CellType.LAVA):
-                if cell.worm is None:
-                    moves.append(Move(MoveType.MOVE, (x, y)))
+    def compute():
+        boards = bitboard.for_state(state)
+        enterable = boards.air | boards.lava if include_lava else boards.air
+        enterable &= ~boards.occupied
+        size = state.grid.size
 
-    return moves
+        moves = [Move(MoveType.NOTHING)]
+        for pos in geometry.for_state(state).neighbours[subject.position]:
+            bit = 1 << (pos[1] * size + pos[0])
+            if boards.dirt & bit:
+                moves.append(Move(MoveType.DIG, pos))
+            elif enterable & bit:
+                moves.append(Move(MoveType.MOVE, pos))
+        return tuple(moves)
+
+    # The Moves are shared by every caller for this state, so they must not
+    # be changed
+    key = ("valid_moves", worm_slot(subject), include_lava)
+    return list(state.analysis.get(key, compute))
 
 
 def hot_cells(state):
     if state.round < 100:
         return set()
-    if state.round >= 302:
-        return set([pos for pos, cell in state.map.items()
-                    if cell.type != CellType.AIR])
-
-    # Lava and everything adjacent to lava is hot
-    hot = set()
-    for pos, cell in state.map.items():
-        x, y = pos
-        if cell.type == CellType.LAVA:
-            hot.add(pos)
-            for dx, dy in DELTAS.values():
-                new_pos = (x + dx, y + dy)
-                if new_pos in state.map:
-                    hot.add(new_pos)
-
-    return hot
+    return bitboard.CellSet(lava.hot(state), state.grid)
 
 
+@instrument.timed
 def can_shoot(state, subject=None):
     if subject is None:
         subject = state.current_worm
 
-    valid = []
-    for direction, (dx, dy) in DELTAS.items():
-        (x, y) = subject.position
-        while True:
-            x += dx
-            y += dy
-            if int(dist((x, y), subject.position)) > 4:
-                break
-            if (x, y) not in state.map:
-                break
-            cell = state.map[(x, y)]
-            if cell.type != CellType.AIR:
-                break
-            if cell.worm is not None:
-                if cell.worm.player == Player.SELF:
-                    break
-                else:
-                    valid.append((direction, cell.worm))
-                    break
+    return _first_worms(state, subject, Player.OPPONENT)
+
 
-    return valid
+def _first_worms(state, shooter, player):
+    # (direction, worm) for each of shooter's gun rays whose first obstacle
+    # is a worm belonging to player
+    boards = bitboard.for_state(state)
+    targets = boards.own if player == Player.SELF else boards.opponent
+    geo = geometry.for_state(state)
+    if not geo.reach(shooter.position)[0] & targets:
+        # No worm of player's is on any of the rays
+        return []
 
+    grid = state.grid
+    blocking = boards.blocking
+    found = []
+    for direction, mask, increasing in geo.ray_masks(shooter.position):
+        i = bitboard.first_blocker(mask, blocking, increasing)
+        if i >= 0 and grid.types[i] == AIR and grid.worms[i]:
+            worm = grid.slots[grid.worms[i]]
+            if worm.player == player:
+                found.append((direction, worm))
+    return found
 
+
+@instrument.timed
 def danger_to_current_worm(state):
 
-    danger = set()
-    for opponent_worm in state.opponent_worms:
-        if not opponent_worm.alive:
-            continue
-        if not opponent_worm.active_before_next_turn:
-            continue
-        # Gun
-        for direction, (dx, dy) in DELTAS.items():
-            (x, y) = opponent_worm.position
-            while True:
-                x += dx
-                y += dy
-                if int(dist((x, y), opponent_worm.position)) > 4:
-                    break
-                if (x, y) not in state.map:
-                    break
-                cell = state.map[(x, y)]
-                if cell.type != CellType.AIR:
-                    break
-                if cell.worm is not None:
-                    if cell.worm != state.current_worm:
-                        break
-                    else:
-                        danger.add(opponent_worm)
-
-        # Banana
-        if opponent_worm.bananas > 0:
-            for cell in state.map:
-                if int(dist(opponent_worm.position, cell)) <= 5:
-                    for (dx, dy), damage in BANANA_DAMAGE.items():
-                        base_x, base_y = cell
-                        x = base_x + dx
-                        y = base_y + dy
-                        target = (x, y)
-                        if target in state.map:
-                            damage_cell = state.map[target]
-                            if (damage_cell.worm is not None and
-                                    damage_cell.worm == state.current_worm):
-                                danger.add(opponent_worm)
-
-    return danger
+    danger_worms = {worm_slot(w): w for w in state.opponent_worms
+                    if w.alive and w.active_before_next_turn}
+    field = threat.for_state(state)
 
+    return set(danger_worms[slot] for slot in
+               field.threats(state.current_worm.position, danger_worms))
 
+
+@instrument.timed
 def banana_moves(state, subject=None):
     if subject is None:
         subject = state.current_worm
 
     move_list = []
 
-    for target_cell in state.map:
-        target_x, target_y = target_cell
-        if int(dist(subject.position, target_cell)) <= 5:
-            own_damage = 0
-            opponent_damage = 0
-            for (dx, dy), damage in BANANA_DAMAGE.items():
-                damage_position = (target_x + dx, target_y + dy)
-                if damage_position in state.map:
-                    damage_cell = state.map[damage_position]
-                    if damage_cell.worm is not None:
-                        if damage_cell.worm.player == Player.SELF:
-                            own_damage += damage
-                        else:
-                            opponent_damage += damage
-
-            if own_damage == 0 and opponent_damage > 0:
-                if DAMAGE_MIN is None or opponent_damage >= DAMAGE_MIN:
-                    move_list.append((Move(MoveType.BANANA, target_cell), opponent_damage))
+    for target_cell, opponent_damage in Targets(state, subject).banana:
+        if DAMAGE_MIN is None or opponent_damage >= DAMAGE_MIN:
+            move_list.append((Move(MoveType.BANANA, target_cell), opponent_damage))
 
     return move_list
 
 
+@instrument.timed
 def snowball_move(state):
 
     if state.current_worm.snowballs <= 0:
         return None
 
-    move_list = []
-
-    for target_cell in state.map:
-        if int(dist(state.current_worm.position, target_cell)) <= 5:
-            own_hit = 0
-            opp_hit = 0
-            target_x, target_y = target_cell
-            for dx, dy in SNOWBALL_DELTAS:
-                hit_position = (target_x + dx, target_y + dy)
-                if hit_position in state.map:
-                    hit_cell = state.map[hit_position]
-                    if hit_cell.worm is not None:
-                        if hit_cell.worm.player == Player.SELF:
-                            own_hit += 1
-                        else:
-                            if hit_cell.worm.rounds_until_unfrozen == 0:
-                                opp_hit += 1
-
-            if own_hit == 0 and opp_hit > 0:
-                move_list.append((Move(MoveType.SNOWBALL, target_cell), opp_hit))
+    # Candidates stay (cell, opponents hit, has worm) until one is chosen
+    move_list = list(Targets(state, state.current_worm).snowball)
 
     if move_list:
         # Return highest number of opponents hit
-        def has_worm(r):
-            move, _ = r
-            worm = state.map[move.target].worm
-            if worm is not None and worm.player == Player.OPPONENT:
-                return 1
-            else:
-                return 0
-
-        move_list.sort(key=has_worm, reverse=True)
+        move_list.sort(key=operator.itemgetter(2), reverse=True)
         move_list.sort(key=operator.itemgetter(1), reverse=True)
-        return move_list[0][0]
+        return Move(MoveType.SNOWBALL, move_list[0][0])
     else:
         return None
 
@@ -259,102 +154,47 @@ def choose_min(move_list):
     return min(move_list, key=operator.itemgetter(1))[0]
 
 
-def min_lava_radius(state):
-    dists = [dist(pos, CENTRE) for pos, cell in state.map.items()
-             if cell.type == CellType.LAVA]
-    if dists:
-        return min(dists)
+def min_lava_d2(state):
+    d2 = lava.nearest_d2(state)
+    if d2 is not None:
+        return d2
     else:
         # Bigger than any possible radius
-        return 1000
+        return 1000 ** 2
 
 
-def weight_to_dirt(state, moves):
-    move_list = []
-    mlr = min_lava_radius(state)
-    for move in moves:
-        weight = 0
-        for cell_pos, cell in state.map.items():
-            if dist(cell_pos, CENTRE) < mlr and cell.type == CellType.DIRT:
-                weight += 1 / (dist(cell_pos, move.target) ** 2)
-        move_list.append((move, weight))
-    return move_list
-
+def min_lava_radius(state):
+    return math.sqrt(min_lava_d2(state))
 
-def dirt_remains(state):
-    mlr = min_lava_radius(state)
-    for pos, cell in state.map.items():
-        if dist(pos, CENTRE) < mlr and cell.type == CellType.DIRT:
-            return True
-    return False
 
+@instrument.timed
+def weight_to_dirt(state, moves):
+    # Sum of 1 / r² to every dirt cell worth digging
+    field = attraction.for_mask(state, _inner_dirt(state))
+    return [(move, field[move.target]) for move in moves]
 
-def shootable_cells(worm, state, dug=None, directions=None, subject=None,
-                    include_banana=True):
-    shootable = []
-    if directions is None:
-        directions = DELTAS
-    if subject is None:
-        subject = state.current_worm
 
-    # Gun
-    for direction in directions:
-        (dx, dy) = DELTAS[direction]
-        (x, y) = worm.position
-        while True:
-            x += dx
-            y += dy
-            if int(dist((x, y), worm.position)) > 4:
-                break
-            if (x, y) not in state.map:
-                break
-            cell = state.map[(x, y)]
-            if cell.type != CellType.AIR and (x, y) != dug:
-                break
-            if cell.worm is not None:
-                # Exclude current worm as it will move
-                if cell.worm != subject:
-                    break
+def _inner_dirt(state):
+    # Dirt closer to the centre than any lava
+    return (bitboard.for_state(state).dirt &
+            bitboard.closer_than(geometry.for_state(state),
+                                 min_lava_d2(state)))
 
-            shootable.append((x, y))
 
-    # Banana
-    banana_cells = set()
-    if include_banana and worm.bananas > 0:
-        for target_cell in state.map:
-            if int(dist(worm.position, target_cell)) <= 5:
-                target_x, target_y = target_cell
-                for dx, dy in BANANA_DAMAGE:
-                    damage_position = (target_x + dx, target_y + dy)
-                    if damage_position in state.map:
-                        banana_cells.add(damage_position)
+def dirt_remains(state):
+    return _inner_dirt(state) != 0
 
-    shootable += list(banana_cells)
 
-    return shootable
+def shootable_cells(worm, state, dug=None, directions=None, subject=None,
+                    include_banana=True):
+    field = threat.for_state(state, subject)
+    return field.cells(worm_slot(worm), dug, directions,
+                       include_banana and worm.bananas > 0)
 
 
 def opponent_shots(state):
-    shots = []
-    worm = state.opp_current_worm
-    for direction, (dx, dy) in DELTAS.items():
-        (x, y) = worm.position
-        while True:
-            x += dx
-            y += dy
-            if int(dist((x, y), worm.position)) > 4:
-                break
-            if (x, y) not in state.map:
-                break
-            cell = state.map[(x, y)]
-            if cell.type != CellType.AIR:
-                break
-            if cell.worm is not None:
-                if cell.worm.player == Player.SELF:
-                    shots.append(direction)
-                break
-
-    return shots
+    return [direction for direction, worm in
+            _first_worms(state, state.opp_current_worm, Player.SELF)]
 
 
 def danger_from_current_shot(state, include_banana=True):
@@ -371,13 +211,16 @@ def danger_from_current_shot(state, include_banana=True):
 
 
 def weight_to_opponents(state, moves):
+    # Walking distance from each target to the nearest living opponent, then
+    # the straight-line distances to all of them
+    living = [w for w in state.opponent_worms if w.alive]
+    field = pathfind.from_cells(state, [w.position for w in living])
     move_list = []
     for move in moves:
-        weight = 0
-        for worm in state.opponent_worms:
-            if worm.alive:
-                weight += dist(move.target, worm.position)
-        move_list.append((move, weight))
+        total = 0
+        for worm in living:
+            total += dist(move.target, worm.position)
+        move_list.append((move, (field[move.target], total)))
 
     return move_list
 
@@ -386,7 +229,8 @@ def furthest_from_opponents(state, moves):
 
     weighted = weight_to_opponents(state, moves)
     # Sort by distance to centre
-    weighted.sort(key=lambda t: dist(t[0].target, CENTRE))
+    centre_d2 = geometry.for_state(state).centre_d2
+    weighted.sort(key=lambda t: centre_d2[t[0].target])
     return choose_max(weighted)
 
 
@@ -394,14 +238,23 @@ def nearest_to_opponents(state, moves):
 
     weighted = weight_to_opponents(state, moves)
     # Sort by distance to centre
-    weighted.sort(key=lambda t: dist(t[0].target, CENTRE))
+    centre_d2 = geometry.for_state(state).centre_d2
+    weighted.sort(key=lambda t: centre_d2[t[0].target])
     return choose_min(weighted)
 
 
 def closest_to_centre(state, moves):
 
+    # Shortest walk to the centre first, preferring routes past powerups
     move_list = moves[:]
-    move_list.sort(key=lambda m: dist(m.target, CENTRE))
+    centre = pathfind.from_centre(state)
+    centre_d2 = geometry.for_state(state).centre_d2
+    if bitboard.for_state(state).powerups:
+        powerups = pathfind.from_powerups(state)
+        move_list.sort(key=lambda m: (centre[m.target], powerups[m.target],
+                                      centre_d2[m.target]))
+    else:
+        move_list.sort(key=lambda m: (centre[m.target], centre_d2[m.target]))
     danger_cells = dangerous_cells(state)
     safe_moves = [m for m in move_list if m.target not in danger_cells]
 
@@ -438,6 +291,7 @@ def next_n_active_worms(state, n):
     return worms
 
 
+@instrument.timed
 def dangerous_cells(state, dug=None, exclude_current=False, subject=None,
                     danger_worms=None, include_banana=True):
 
@@ -448,31 +302,45 @@ def dangerous_cells(state, dug=None, exclude_current=False, subject=None,
     if exclude_current:
         danger_worms = [w for w in danger_worms if not w.active]
 
-    danger_cells = set()
-    for w in danger_worms:
-        danger_cells.update(shootable_cells(w, state, dug, subject=subject,
-                                            include_banana=include_banana))
+    if subject is None:
+        subject = state.current_worm
+
+    def compute():
+        danger_cells = set()
+        for w in danger_worms:
+            danger_cells.update(shootable_cells(w, state, dug, subject=subject,
+                                                include_banana=include_banana))
+        return frozenset(danger_cells)
 
-    return danger_cells
+    key = ("dangerous", dug, worm_slot(subject),
+           tuple(sorted((worm_slot(w), include_banana and w.bananas > 0)
+                        for w in danger_worms)))
+    return set(state.analysis.get(key, compute))
 
 
 def shootability_count(state):
-    danger_worms = [w for w in state.opponent_worms
-                    if w.active_before_next_turn and not w.active]
+    danger_worms = set(worm_slot(w) for w in state.opponent_worms
+                       if w.active_before_next_turn and not w.active)
 
+    field = threat.for_state(state)
     counts = defaultdict(int)
-    for w in danger_worms:
-        cells = shootable_cells(w, state)
-        for cell in cells:
-            counts[cell] += 1
+    for cell in field.threatened_cells():
+        count = field.count(cell, danger_worms)
+        if count:
+            counts[cell] = count
 
     return counts
 
 
 def exclude_dangerous_digging(state, move_list):
 
+    danger_worms = set(worm_slot(w) for w in state.opponent_worms
+                       if w.active_before_next_turn)
+    field = threat.for_state(state)
+    position = state.current_worm.position
+
     return [m for m in move_list
-            if state.current_worm.position not in dangerous_cells(state, dug=m.target)]
+            if not field.threatened(position, danger_worms, dug=m.target)]
 
 
 def move_to_powerup(state):
@@ -487,9 +355,12 @@ def move_to_powerup(state):
 
 def move_to_lowest_health_opponent(state):
 
-    opp = min(state.opponent_worms, key=lambda w: w.health)
+    living = [w for w in state.opponent_worms if w.alive]
+    opp = min(living or state.opponent_worms, key=lambda w: w.health)
+    field = pathfind.from_worm(state, opp)
     moves = filter_type(valid_moves(state), MoveType.MOVE)
-    best_move = min(moves, key=lambda m: dist(m.target, opp.position))
+    best_move = min(moves, key=lambda m: (field[m.target],
+                                          dist(m.target, opp.position)))
 
     return best_move
 
@@ -514,38 +385,23 @@ def should_engage(state, subject=None):
              not (len(state.own_worms) == 1 and len(state.opponent_worms) > 1)))
 
 
+@instrument.timed
 def banana_dig(state):
 
     if state.current_worm.bananas <= 0:
         return None
 
-    moves = []
-    for cell in state.map:
-        x, y = cell
-        own_damage = False
-        digs = 0
-        if int(dist(state.current_worm.position, cell)) <= 5:
-            for dx, dy in BANANA_DAMAGE:
-                target = (x + dx, y + dy)
-                if target in state.map:
-                    target_cell = state.map[target]
-                    if (target_cell.worm is not None and
-                            target_cell.worm.player == Player.SELF):
-                        own_damage = True
-                    if target_cell.type == CellType.DIRT:
-                        digs += 1
-
-        if not own_damage and digs > 0:
-            moves.append((Move(MoveType.BANANA, cell), digs))
-
-    moves = [(m, d) for m, d in moves if d >= BANANA_DIG_MINIMUM]
+    moves = [(cell, digs)
+             for cell, digs in Targets(state, state.current_worm).banana_dig
+             if digs >= BANANA_DIG_MINIMUM]
 
     if moves:
         moves.sort(key=operator.itemgetter(1), reverse=True)
         logging.info("Banana digs: %s", moves)
-        return moves[0][0]
+        return Move(MoveType.BANANA, moves[0][0])
 
 
+@instrument.timed
 def get_select_move(state):
 
     if state.selects_remaining == 0:
@@ -553,7 +409,8 @@ def get_select_move(state):
 
     logging.info("Selects: %d", state.selects_remaining)
 
-    possibilities = []
+    # Idle worms an opponent could hit before their next turn
+    escaping = []
     for worm in state.own_worms:
         if not worm.alive or worm.active:
             continue
@@ -565,19 +422,31 @@ def get_select_move(state):
             logging.info("%s belongs there", worm)
             continue
 
-        moves = filter_type(valid_moves(state, worm), MoveType.MOVE)
         danger_worms = next_n_active_worms(state, worm.turns_till_active)
         logging.info("For %s, danger worms: %s", worm, danger_worms)
-        danger_cells = dangerous_cells(state, subject=worm,
-                                       danger_worms=danger_worms)
-        danger_targets = dangerous_cells(state, subject=worm)
-
-        safe_moves = [m for m in moves if m.target not in danger_targets]
+        if (candidates.danger(state, worm, danger_worms) >>
+                state.grid.index(worm.position) & 1):
+            escaping.append(worm)
+
+    # Their safe moves, scored together. The walking distances are only
+    # worked out if there are any.
+    moves = candidates.score(
+        state, [c for worm in escaping
+                for c in candidates.commands(state, worm, True,
+                                             {MoveType.MOVE})],
+        features={"danger"})
+    safe_moves = candidates.score(
+        state, [c for c in moves if not c.danger and not c.lava],
+        features={"opponents"})
 
-        if worm.position in danger_cells and safe_moves:
-            move = furthest_from_opponents(state, safe_moves)
-            move.select = worm
-            possibilities.append(move)
+    possibilities = []
+    for worm in escaping:
+        safe = [c for c in safe_moves if c.worm is worm]
+        if safe:
+            # Furthest from the opponents, nearest the centre on ties
+            safe.sort(key=lambda c: c.centre_d2)
+            best = max(safe, key=lambda c: c.opponents)
+            possibilities.append(best.move())
 
     if possibilities:
         possibilities.sort(key=lambda m: m.select.health)
@@ -586,6 +455,7 @@ def get_select_move(state):
         return None
 
 
+@instrument.timed
 def run_away(state):
 
     # Get safe moves
@@ -667,8 +537,23 @@ def run_away(state):
         return Move(MoveType.NOTHING)
 
 
-def get_move(state):
+@instrument.record
+def get_move(state, deadline=None):
+    # deadline is the perf_counter time the move is needed by, if any; only
+    # the searches after choose_move watch it
+    move = choose_move(state)
+    if ENDGAME and not dirt_remains(state):
+        instrument.stage("endgame_solve", branch=False)
+        move = endgame.solve(state, move, deadline)
+    elif SEARCH_MODE:
+        instrument.stage("search", branch=False)
+        move = search.choose(state, move, SEARCH_MODE, deadline)
+    return move
+
+
+def choose_move(state):
 
+    instrument.stage("setup")
     for worm in state.own_worms:
         if worm.health > 0:
             if worm.rounds_until_unfrozen > 0:
@@ -694,11 +579,13 @@ def get_move(state):
             logging.info("ABNT: %s", w)
 
     # Get powerup if next to it
+    instrument.stage("powerup")
     powerup_move = move_to_powerup(state)
     if powerup_move is not None:
         logging.info("Getting powerup")
         return powerup_move
 
+    instrument.stage("hot")
     moves = valid_moves(state)
     dig_only = filter_type(moves, MoveType.DIG)
     move_only = filter_type(moves, MoveType.MOVE)
@@ -744,6 +631,7 @@ def get_move(state):
     move_only = filter_type(moves, MoveType.MOVE)
 
     # Urgent moves
+    instrument.stage("danger")
     if danger:
         if not shoot:
             logging.info("Running away from banana")
@@ -761,6 +649,7 @@ def get_move(state):
                 return run_away(state)
 
     # Shoot if no danger - repeat of above
+    instrument.stage("shoot")
     if shoot:
         logging.info("Shoot but no danger")
         if not any(w.active_before_next_turn for _, w in shoot):
@@ -772,30 +661,36 @@ def get_move(state):
             return shoot_lowest_health(state)
 
     # No urgent move for current worm - check if it makes sense selecting
+    instrument.stage("select")
     select_move = get_select_move(state)
     if select_move is not None:
         logging.info("Selecting! Move: %s", select_move)
         return select_move
 
     # Throw snowball
+    instrument.stage("snowball")
     snowball = snowball_move(state)
     if snowball is not None:
         logging.info("Snowballing")
         return snowball
 
     # Dig with banana
+    instrument.stage("banana_dig")
     b_dig = banana_dig(state)
     if b_dig is not None:
         logging.info("Digging with banana")
         return b_dig
 
+    instrument.stage("dig")
     safe_dig = exclude_dangerous_digging(state, dig_only)
     if len(safe_dig) != len(dig_only):
         logging.info("Eliminated dig due to danger")
     if safe_dig:
+        logging.info("Digging")
         return random.choice(safe_dig)
 
     # Filter out moving into danger
+    instrument.stage("move")
     danger_cells = dangerous_cells(state)
     old_move_only = move_only[:]
     move_only = [m for m in move_only if m.target not in danger_cells]
@@ -808,10 +703,12 @@ def get_move(state):
             return Move(MoveType.NOTHING)
 
     if is_still_dirt:
+        logging.info("Moving towards dirt")
         weighted = weight_to_dirt(state, move_only)
         return choose_max(weighted)
 
     # No dirt is left: endgame vs another digger bot
+    instrument.stage("endgame")
     logging.info("No dirt!!")
     move_only = filter_type(moves, MoveType.MOVE)
     if state.own_score < state.opp_score:
@@ -0,0 +1,80 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import threading
+from collections import OrderedDict
+
+
+class AnalysisCache:
+
+    # Memoises analysis results for one State. Keys must only contain plain
+    # values (positions, worm slots, flags) so cached results never depend
+    # on which Worm objects were used to compute them.
+
+    def __init__(self):
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        return value
+
+    def __str__(self):
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+class TranspositionCache:
+
+    # Bounded LRU map from position hashes to whatever was worked out for
+    # that position, shared across rounds (and matches, within a process).
+    # The least recently used entry is evicted once capacity is reached.
+    # A search that missed its deadline may still be using it, hence the lock.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"size": len(self.entries), "capacity": self.capacity,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hit_rate()}
+
+    def __str__(self):
+        return (f"{self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate():.0%}), {len(self.entries)}/"
+                f"{self.capacity} entries, {self.evictions} evictions")
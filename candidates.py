@@ -0,0 +1,255 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import math
+from state import Move, MoveType, Player, AIR, worm_slot
+from rules import Direction, GUN_DAMAGE, LAVA_DAMAGE
+from targeting import blast_grids
+import attraction
+import bitboard
+import geometry
+import lava
+import pathfind
+import threat
+
+
+# Weights that turn a candidate's features into one value, in rough health
+# points: what it deals, less what the worm is likely to take where it ends
+# up. A frozen worm loses about two turns of gun damage.
+FREEZE_VALUE = 2 * GUN_DAMAGE
+DANGER_COST = GUN_DAMAGE
+HOT_COST = 2 * LAVA_DAMAGE
+LAVA_COST = 2 * LAVA_DAMAGE
+CENTRE_COST = 0.5
+DIRT_VALUE = 1
+
+ALL_TYPES = frozenset(MoveType)
+FEATURES = frozenset(("damage", "danger", "hot", "centre", "opponents",
+                      "dirt"))
+
+_STEPS = (MoveType.MOVE, MoveType.DIG)
+
+
+class Candidate:
+
+    # One legal command for one worm. Scoring fills in what the command does
+    # this round, all as seen from the cell the worm ends up on: damage
+    # dealt (less friendly damage), opponents frozen, whether an opponent
+    # could hit it there, whether it is hot or lava, walking distance to
+    # the centre, (walking, straight-line) distance to the opponents and
+    # dirt attraction. Features that weren't asked for stay 0. Danger is
+    # only known for our own worms.
+
+    __slots__ = ("code", "worm", "select", "move_type", "target", "end",
+                 "damage", "freezes", "danger", "hot", "lava", "centre",
+                 "centre_d2", "opponents", "dirt")
+
+    def __init__(self, worm, select, move_type, target=None):
+        self.code = Move.encode(move_type, target, worm if select else None)
+        self.worm = worm
+        self.select = select
+        self.move_type = move_type
+        self.target = target
+        self.end = target if move_type == MoveType.MOVE else worm.position
+        self.damage = self.freezes = self.centre = self.centre_d2 = 0
+        self.danger = self.hot = self.lava = False
+        self.opponents = (0, 0)
+        self.dirt = 0
+
+    def move(self):
+        return Move(self.move_type, self.target,
+                    self.worm if self.select else None)
+
+    def value(self):
+        return (self.damage + FREEZE_VALUE * self.freezes -
+                DANGER_COST * self.danger - HOT_COST * self.hot -
+                LAVA_COST * self.lava - CENTRE_COST * self.centre +
+                DIRT_VALUE * self.dirt)
+
+    def __repr__(self):
+        return repr(self.move())
+
+
+def danger(state, worm, danger_worms=None):
+    # Bitset of the cells the danger worms could hit with worm moved out of
+    # the way; by default every opponent moving before our next turn.
+    # Always 0 for opponent worms.
+    if worm.player != Player.SELF:
+        return 0
+    if danger_worms is None:
+        danger_worms = [w for w in state.opponent_worms
+                        if w.active_before_next_turn]
+
+    def compute():
+        field = threat.for_state(state, worm)
+        size = state.grid.size
+        cells = set()
+        for w in danger_worms:
+            cells.update(field.cells(worm_slot(w),
+                                     include_banana=w.bananas > 0))
+        return sum(1 << (y * size + x) for x, y in cells)
+
+    key = ("danger_bits", worm_slot(worm),
+           tuple(sorted(worm_slot(w) for w in danger_worms)))
+    return state.analysis.get(key, compute)
+
+
+def dirt(state):
+    # Attraction to the dirt closer to the centre than any lava
+    d2 = lava.nearest_d2(state)
+    mask = bitboard.for_state(state).dirt
+    if d2 is not None:
+        mask &= bitboard.closer_than(geometry.for_state(state), d2)
+    return attraction.for_mask(state, mask)
+
+
+def commands(state, worm, select=False, types=ALL_TYPES):
+    # Every legal command for worm, in a fixed order: doing nothing, moves
+    # and digs in neighbour order, shots, then throws in map order
+    found = []
+    if MoveType.NOTHING in types:
+        found.append(Candidate(worm, select, MoveType.NOTHING))
+    if worm.rounds_until_unfrozen > 0:
+        # Anything else is ignored by the engine
+        return found
+
+    geo = geometry.for_state(state)
+    boards = bitboard.for_state(state)
+    if MoveType.MOVE in types or MoveType.DIG in types:
+        enterable = (boards.air | boards.lava) & ~boards.occupied
+        size = state.grid.size
+        for pos in geo.neighbours[worm.position]:
+            bit = 1 << (pos[1] * size + pos[0])
+            if boards.dirt & bit:
+                if MoveType.DIG in types:
+                    found.append(Candidate(worm, select, MoveType.DIG, pos))
+            elif enterable & bit and MoveType.MOVE in types:
+                found.append(Candidate(worm, select, MoveType.MOVE, pos))
+
+    if MoveType.SHOOT in types:
+        found += [Candidate(worm, select, MoveType.SHOOT, direction)
+                  for direction in Direction]
+    for move_type, count in ((MoveType.BANANA, worm.bananas),
+                             (MoveType.SNOWBALL, worm.snowballs)):
+        if move_type in types and count > 0:
+            found += [Candidate(worm, select, move_type, pos)
+                      for pos in geo.throw_range[worm.position]]
+    return found
+
+
+def generate(state, player=Player.SELF, types=ALL_TYPES, current=True,
+             selects=True):
+    # The player's current worm's commands, then each other living worm's
+    # commands with a select, if the player has selects left. Frozen worms
+    # aren't worth selecting.
+    if player == Player.SELF:
+        worms = state.own_worms
+        current_worm = state.current_worm
+        remaining = state.selects_remaining
+    else:
+        worms = state.opponent_worms
+        current_worm = state.opp_current_worm
+        remaining = state.opp_selects_remaining
+
+    found = []
+    if current:
+        found += commands(state, current_worm, types=types)
+    if selects and remaining > 0:
+        for worm in worms:
+            if (worm.alive and worm is not current_worm and
+                    worm.rounds_until_unfrozen == 0):
+                found += commands(state, worm, True, types)
+    return found
+
+
+def score(state, candidates, features=FEATURES):
+    # Fills in the features asked for on every candidate in one pass, and
+    # returns the candidates. The tables they are read from (danger bitsets,
+    # walking distances, dirt attraction, blast grids) are built once per
+    # state and shared by every candidate and caller.
+    if not candidates:
+        return candidates
+    grid = state.grid
+    size = grid.size
+    geo = geometry.for_state(state)
+    boards = bitboard.for_state(state)
+    wanted = features.__contains__
+    hot = lava.hot(state) if wanted("hot") else 0
+    lava_cells = boards.lava
+    centre = pathfind.from_centre(state).dist if wanted("centre") else None
+    living = [w.position for w in state.opponent_worms if w.alive]
+    opponents = (pathfind.from_cells(state, living).dist
+                 if wanted("opponents") else None)
+    dirt_field = dirt(state) if wanted("dirt") else None
+    grids = blast_grids(state) if wanted("damage") else None
+    centre_d2 = geo.centre_d2
+    dangers = dict()
+    rays = dict()
+
+    for c in candidates:
+        worm = c.worm
+        if wanted("danger") and worm not in dangers:
+            dangers[worm] = danger(state, worm)
+
+        x, y = c.end
+        end = y * size + x
+        bit = 1 << end
+        if wanted("danger"):
+            c.danger = bool(dangers[worm] & bit)
+        c.hot = bool(hot & bit)
+        c.lava = bool(lava_cells & bit)
+        c.centre_d2 = centre_d2[c.end]
+        if centre is not None:
+            c.centre = centre[end]
+        if opponents is not None:
+            c.opponents = (opponents[end],
+                           sum(math.sqrt((x - ox) ** 2 + (y - oy) ** 2)
+                               for ox, oy in living))
+
+        move_type = c.move_type
+        if move_type in _STEPS:
+            if dirt_field is not None:
+                c.dirt = dirt_field[c.target]
+        elif grids is not None:
+            c.damage, c.freezes = _attack(state, c, grids, rays)
+    return candidates
+
+
+def _attack(state, c, grids, rays):
+    # (damage dealt less friendly damage, worms frozen less own) of a shot
+    # or throw
+    worm = c.worm
+    friendly = worm.player == Player.SELF
+    grid = state.grid
+    if c.move_type == MoveType.SHOOT:
+        if worm.position not in rays:
+            rays[worm.position] = {
+                direction: (mask, increasing) for direction, mask, increasing
+                in geometry.for_state(state).ray_masks(worm.position)}
+        mask, increasing = rays[worm.position][c.target]
+        i = bitboard.first_blocker(mask, bitboard.for_state(state).blocking,
+                                   increasing)
+        if i >= 0 and grid.types[i] == AIR and grid.worms[i]:
+            hit = grid.slots[grid.worms[i]]
+            return (GUN_DAMAGE if hit.player != worm.player
+                    else -GUN_DAMAGE), 0
+        return 0, 0
+
+    if c.move_type not in (MoveType.BANANA, MoveType.SNOWBALL):
+        return 0, 0
+    own_damage, opp_damage, own_hits, opp_hits = grids
+    x, y = c.target
+    t = y * grid.size + x
+    if c.move_type == MoveType.BANANA:
+        damage = opp_damage[t] - own_damage[t]
+        return (damage if friendly else -damage), 0
+    # opp_hits leaves out frozen opponents, own_hits doesn't
+    freezes = opp_hits[t] - own_hits[t]
+    return 0, (freezes if friendly else -freezes)
+
+
+def best(state, candidates):
+    # The highest valued candidate, the first of any ties
+    return max(score(state, candidates), key=Candidate.value, default=None)
@@ -0,0 +1,224 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import logging
+import os
+import time
+
+from state import MoveType, Player
+from rules import MAX_ROUNDS
+from cache import TranspositionCache
+import candidates
+import search
+
+
+# Set WORMS_ENDGAME=1 to have get_move check its moves with the solver once
+# the dirt is gone. It is off by default: every such round then takes up to
+# BUDGET longer.
+ENABLED = os.environ.get("WORMS_ENDGAME", "") not in ("", "0")
+
+# Seconds the solver may take per round; the deepest search finished by
+# then decides
+BUDGET = float(os.environ.get("WORMS_ENDGAME_BUDGET", "0.3"))
+MAX_DEPTH = 6
+
+# Set WORMS_ENDGAME_DEPTH to search to that depth with no clock instead, so
+# the move doesn't depend on how busy the machine is
+DEPTH = int(os.environ.get("WORMS_ENDGAME_DEPTH", "0"))
+
+# Positions kept between rounds, so the subtree the game went down is
+# already searched when the next round starts
+CAPACITY = 100000
+
+# Selects worth trying on our side; the opponent's selects aren't searched
+SELECT_WIDTH = 2
+
+# A side with no worms left has lost, whatever else the evaluation says
+WIPED_OUT = 1000
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+memo = TranspositionCache(CAPACITY)
+
+nodes = 0
+seconds = 0.0
+solves = 0
+depths = 0
+
+
+class _Timeout(Exception):
+    pass
+
+
+def key(state):
+    # Everything the value of a position depends on: the map, every worm,
+    # whose turn it is, the round (which fixes the lava from here on) and
+    # the score difference the evaluation counts
+    return (state.zobrist_hash(), state.round,
+            state.own_score - state.opp_score)
+
+
+def commands(state, player):
+    # Doing nothing, every move and dig, shots that hit a worm, the best
+    # banana and snowball if they do anything and, for us, the best few
+    # selects. A shot at nothing is the same as doing nothing here.
+    found = candidates.score(state, candidates.generate(state, player),
+                             features={"damage", "danger", "hot"})
+    found.sort(key=candidates.Candidate.value, reverse=True)
+
+    chosen = []
+    throws = set()
+    selects = 0
+    for c in found:
+        if c.select:
+            if player != Player.SELF or selects >= SELECT_WIDTH:
+                continue
+            selects += 1
+        elif c.move_type == MoveType.SHOOT:
+            if not c.damage:
+                continue
+        elif c.move_type in (MoveType.BANANA, MoveType.SNOWBALL):
+            if c.move_type in throws or (c.damage <= 0 and c.freezes <= 0):
+                continue
+            throws.add(c.move_type)
+        chosen.append(c.move())
+    return chosen
+
+
+def _terminal(state):
+    own = any(w.alive for w in state.own_worms)
+    opp = any(w.alive for w in state.opponent_worms)
+    if own and opp:
+        return None if state.round <= MAX_ROUNDS else 0
+    return (own - opp) * WIPED_OUT
+
+
+class _Solver:
+
+    # Depth-limited maximin over both players' commands with alpha-beta
+    # cutoffs: we pick a command, then the opponent picks the reply that is
+    # worst for us. Values are kept in the memo with the depth they were
+    # searched to and whether they are exact or a bound.
+
+    def __init__(self, state, deadline):
+        self.state = state
+        self.deadline = deadline
+        self.nodes = 0
+
+    def value(self, depth, alpha, beta):
+        state = self.state
+        end = _terminal(state)
+        if end is not None:
+            return end + search.evaluate(state)
+        if depth == 0:
+            return search.evaluate(state)
+
+        position = key(state)
+        entry = memo.get(position)
+        first = None
+        if entry is not None:
+            searched, value, bound, first = entry
+            if searched >= depth:
+                if (bound == EXACT or (bound == LOWER and value >= beta) or
+                        (bound == UPPER and value <= alpha)):
+                    return value
+        value, best = self._search(depth, alpha, beta, first)
+        if value <= alpha:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        memo.put(position, (depth, value, bound, best))
+        return value
+
+    def _search(self, depth, alpha, beta, first=None, rows=None):
+        # (value, code of the best command); the command coded first is
+        # tried first
+        state = self.state
+        if rows is None:
+            rows = commands(state, Player.SELF)
+        if first is not None:
+            rows.sort(key=lambda m: m.code() != first)
+        columns = commands(state, Player.OPPONENT)
+
+        best, best_code = None, None
+        for row in rows:
+            worst = None
+            for column in columns:
+                if (self.deadline is not None and
+                        time.perf_counter() > self.deadline):
+                    raise _Timeout()
+                state.play(row, column)
+                self.nodes += 1
+                try:
+                    value = self.value(depth - 1, alpha,
+                                       beta if worst is None
+                                       else min(beta, worst))
+                finally:
+                    state.undo()
+                if worst is None or value < worst:
+                    worst = value
+                if worst <= alpha:
+                    break
+            if best is None or worst > best:
+                best, best_code = worst, row.code()
+                alpha = max(alpha, best)
+                if best >= beta:
+                    break
+        return best, best_code
+
+
+def solve(state, move, deadline=None):
+    # The best command by the deepest search finished within BUDGET (or by
+    # deadline, if that is sooner), or move if not even one round could be
+    # searched. With DEPTH set, the search to that depth decides, however
+    # long it takes. move is searched first, so it is kept unless something
+    # is strictly better.
+    global nodes, seconds, solves, depths
+
+    if not state.valid(move):
+        return move
+
+    start = time.perf_counter()
+    if DEPTH:
+        end, last = None, DEPTH
+    else:
+        end, last = start + BUDGET, MAX_DEPTH
+        if deadline is not None:
+            end = min(end, deadline)
+    solver = _Solver(state, end)
+    rows = commands(state, Player.SELF)
+    rows = [move] + [m for m in rows if m.code() != move.code()]
+    chosen, depth = move, 0
+
+    try:
+        for depth in range(1, last + 1):
+            value, code = solver._search(depth, -float("inf"),
+                                         float("inf"), rows=rows)
+            chosen = next(m for m in rows if m.code() == code)
+            # Best first next time round
+            rows.sort(key=lambda m: m.code() != code)
+    except _Timeout:
+        depth -= 1
+
+    elapsed = time.perf_counter() - start
+    nodes += solver.nodes
+    seconds += elapsed
+    solves += 1
+    depths += depth
+    logging.info("Endgame: depth %d, %d nodes in %.1f ms, chose %s over %s",
+                 depth, solver.nodes, elapsed * 1000, chosen, move)
+    return chosen
+
+
+def rate():
+    return nodes / seconds if seconds else 0
+
+
+def summary():
+    return (f"{solves} solves, mean depth "
+            f"{depths / solves if solves else 0:.1f}, {nodes} nodes, "
+            f"{rate():.0f} nodes/s, memo {memo}")
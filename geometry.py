@@ -0,0 +1,220 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from bisect import bisect_right
+
+from rules import (DELTAS, BANANA_DAMAGE, SNOWBALL_DELTAS, CENTRE, GUN_RANGE,
+                   THROW_OFFSETS, THROW_RANGE)
+
+# Maps every non-space cell code to 1, so the deep space layout can be used
+# as the cache key for a match
+_LAYOUT_TABLE = bytes([0] + [1] * 255)
+
+_cache = dict()
+
+
+def _spread(deltas):
+    return sorted(set((rx + dx, ry + dy) for rx, ry in THROW_OFFSETS
+                      for dx, dy in deltas))
+
+
+# Offsets a banana or snowball can reach from the thrower
+_BLAST_SPREAD = _spread(BANANA_DAMAGE)
+_FREEZE_SPREAD = _spread(SNOWBALL_DELTAS)
+
+
+class Geometry:
+
+    # Everything about the map that can't change during a match: which cells
+    # exist, gun rays, throwing ranges, neighbours and distances to the centre.
+    # Tables are keyed by position and only contain in-map cells.
+
+    def __init__(self, grid):
+        self.size = grid.size
+        self.cells = [grid.position(i) for i, t in enumerate(grid.types) if t]
+        in_map = set(self.cells)
+        self.in_map = in_map
+
+        self.neighbours = dict()
+        self.rays = dict()
+        self._ray_masks = dict()
+        self.throw_range = dict()
+        self.centre_d2 = dict()
+        self._blast = dict()
+        self._freeze = dict()
+        self._reach = dict()
+        self._adjacent = None
+
+        cx, cy = CENTRE
+        for pos in self.cells:
+            x, y = pos
+
+            self.neighbours[pos] = [(x + dx, y + dy)
+                                    for dx, dy in DELTAS.values()
+                                    if (x + dx, y + dy) in in_map]
+
+            # Gun rays, cut off at the range limit and the edge of the map
+            rays = dict()
+            for direction, (dx, dy) in DELTAS.items():
+                ray = []
+                step = 1
+                while True:
+                    d2 = (dx * step) ** 2 + (dy * step) ** 2
+                    target = (x + dx * step, y + dy * step)
+                    if d2 >= (GUN_RANGE + 1) ** 2 or target not in in_map:
+                        break
+                    ray.append(target)
+                    step += 1
+                rays[direction] = tuple(ray)
+            self.rays[pos] = rays
+
+            self.throw_range[pos] = tuple((x + dx, y + dy)
+                                          for dx, dy in THROW_OFFSETS
+                                          if (x + dx, y + dy) in in_map)
+
+            self.centre_d2[pos] = (x - cx) ** 2 + (y - cy) ** 2
+
+        # Outermost cells first
+        self.by_centre_d2 = sorted(self.cells, key=self.centre_d2.get,
+                                   reverse=True)
+
+        # Bitsets of every map cell, and of the cells at most each squared
+        # distance from the centre (d2_masks[i] goes with d2_values[i])
+        self.in_map_mask = _mask(self.cells, self.size)
+        self.d2_values = []
+        self.d2_masks = []
+        mask = 0
+        for pos in reversed(self.by_centre_d2):
+            d2 = self.centre_d2[pos]
+            if self.d2_values and self.d2_values[-1] != d2:
+                self.d2_masks.append(mask)
+            if not self.d2_values or self.d2_values[-1] != d2:
+                self.d2_values.append(d2)
+            mask |= 1 << (pos[1] * self.size + pos[0])
+        self.d2_masks.append(mask)
+
+        # Cells that don't wrap onto the next row when shifted left or right
+        size = self.size
+        self.not_left_edge = _mask([(x, y) for x, y in self.cells if x > 0],
+                                   size)
+        self.not_right_edge = _mask([(x, y) for x, y in self.cells
+                                     if x < size - 1], size)
+
+        # Bit 0 of every row, to repeat a row mask down the map, and the
+        # throwing range around (THROW_RANGE, THROW_RANGE)
+        self._rows = _mask([(0, y) for y in range(size)], size)
+        self._throw_kernel = _mask([(dx + THROW_RANGE, dy + THROW_RANGE)
+                                    for dx, dy in THROW_OFFSETS], size)
+
+    def ray_masks(self, pos):
+        # The gun rays from pos as (direction, bitset, whether bit indices
+        # increase along the ray), for bitboard.first_blocker
+        if pos not in self._ray_masks:
+            self._ray_masks[pos] = [
+                (direction, _mask(ray, self.size),
+                 dy > 0 or (dy == 0 and dx > 0))
+                for (direction, ray), (dx, dy) in zip(self.rays[pos].items(),
+                                                      DELTAS.values())]
+        return self._ray_masks[pos]
+
+    def outside(self, d2):
+        # Bitset of the cells further than sqrt(d2) from the centre
+        inside = bisect_right(self.d2_values, d2) - 1
+        if inside < 0:
+            return self.in_map_mask
+        return self.in_map_mask & ~self.d2_masks[inside]
+
+    def adjacent(self):
+        # Neighbour indices of every cell by index, for searches over the
+        # grid arrays
+        if self._adjacent is None:
+            size = self.size
+            adjacent = [()] * (size * size)
+            for (x, y), cells in self.neighbours.items():
+                adjacent[y * size + x] = tuple(ny * size + nx
+                                               for nx, ny in cells)
+            self._adjacent = adjacent
+        return self._adjacent
+
+    def blast_area(self, pos):
+        # Every cell a banana thrown from pos could damage
+        if pos not in self._blast:
+            self._blast[pos] = self._area(pos, BANANA_DAMAGE, _BLAST_SPREAD)
+        return self._blast[pos]
+
+    def freeze_area(self, pos):
+        # Every cell a snowball thrown from pos could freeze
+        if pos not in self._freeze:
+            self._freeze[pos] = self._area(pos, SNOWBALL_DELTAS,
+                                           _FREEZE_SPREAD)
+        return self._freeze[pos]
+
+    def reach(self, pos):
+        # Bitsets of the cells a worm could stand on to hit pos, as (gun,
+        # banana, snowball). Gun lines ignore whatever might block them.
+        # Every weapon's reach is symmetric, so these are pos's own gun rays
+        # and the throwing ranges of the cells whose blast covers pos.
+        if pos not in self._reach:
+            gun = 0
+            for _, mask, _ in self.ray_masks(pos):
+                gun |= mask
+            self._reach[pos] = (gun, self._throwers(pos, BANANA_DAMAGE),
+                                self._throwers(pos, SNOWBALL_DELTAS))
+        return self._reach[pos]
+
+    def _throwers(self, pos, deltas):
+        x, y = pos
+        mask = 0
+        for dx, dy in deltas:
+            target = (x - dx, y - dy)
+            if target in self.in_map:
+                mask |= self._throw_mask(target)
+        return mask
+
+    def _throw_mask(self, pos):
+        # Bitset of throw_range[pos]: one shift of the range drawn around a
+        # corner cell, cut down to the columns it can reach so nothing wraps
+        # onto the next row
+        size = self.size
+        x, y = pos
+        shift = (y - THROW_RANGE) * size + x - THROW_RANGE
+        mask = (self._throw_kernel << shift if shift >= 0
+                else self._throw_kernel >> -shift)
+        left = max(x - THROW_RANGE, 0)
+        right = min(x + THROW_RANGE, size - 1)
+        columns = ((1 << (right - left + 1)) - 1) << left
+        return mask & self.in_map_mask & columns * self._rows
+
+    def _area(self, pos, deltas, spread):
+        x, y = pos
+        if len(self.throw_range[pos]) == len(THROW_OFFSETS):
+            # Every target is on the map, only the blast can fall off it
+            return frozenset(target for target in
+                             ((x + dx, y + dy) for dx, dy in spread)
+                             if target in self.in_map)
+
+        cells = set()
+        for target_x, target_y in self.throw_range[pos]:
+            for dx, dy in deltas:
+                target = (target_x + dx, target_y + dy)
+                if target in self.in_map:
+                    cells.add(target)
+        return frozenset(cells)
+
+
+def _mask(cells, size):
+    mask = 0
+    for x, y in cells:
+        mask |= 1 << (y * size + x)
+    return mask
+
+
+def for_state(state):
+    if state.geometry is None:
+        key = bytes(state.grid.types.translate(_LAYOUT_TABLE))
+        if key not in _cache:
+            _cache[key] = Geometry(state.grid)
+        state.geometry = _cache[key]
+    return state.geometry
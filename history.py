@@ -6,7 +6,7 @@
 import logging
 
 from state import MoveType, CellType, Profession
-from bot import BANANA_DAMAGE
+from rules import BANANA_DAMAGE
 
 
 DEFAULT = {
@@ -26,6 +26,12 @@ def calc_damage(current_worms, previous_worms):
 
 
 def dug_cells(state, last_state):
+    if state.changed_since == last_state.round:
+        # Only cells that changed since last_state can have been dug
+        return set(pos for pos, old in state.changed_cells.items()
+                   if old == CellType.DIRT and
+                   state.map[pos].type == CellType.AIR)
+
     dug = set()
     for cell in state.map:
         curr = state.map[cell]
@@ -59,7 +65,7 @@ def calculate(last_state, state, last_move, previous):
 
     if last_state is None or previous is None:
         # First round
-        return DEFAULT
+        return dict(DEFAULT)
 
     # Check snowballs using previous move
     if "snowball" in state.opp_previous_command:
@@ -77,7 +83,7 @@ def old_calculate(last_state, state, last_move, previous):
 
     if last_state is None or previous is None:
         # First round
-        return DEFAULT
+        return dict(DEFAULT)
 
     # Check snowballs using previous move
     if "snowball" in state.opp_previous_command:
@@ -0,0 +1,134 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Set WORMS_INSTRUMENT=1 to time get_move's stages and heavy helpers. Each
+# round is appended as a JSON line to WORMS_INSTRUMENT_FILE (set it empty to
+# only keep the last record in memory). When off, stage() is an empty call
+# and the decorators return the functions unchanged.
+ENABLED = os.environ.get("WORMS_INSTRUMENT", "") not in ("", "0")
+output_path = os.environ.get("WORMS_INSTRUMENT_FILE", "instrument.jsonl")
+
+# Record of the most recent round
+last = None
+
+# Round being recorded, per thread so a late search can't mix into the next
+_local = threading.local()
+_out = None
+
+
+class _Round:
+
+    def __init__(self, round_number):
+        self.round = round_number
+        self.start = time.perf_counter()
+        self.stage = None
+        self.branch = None
+        self.stage_start = self.start
+        self.stages = dict()
+        self.calls = dict()
+
+    def enter(self, name, branch=True):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.stages[self.stage] = (self.stages.get(self.stage, 0)
+                                       + now - self.stage_start)
+        self.stage = name
+        self.stage_start = now
+        if branch:
+            self.branch = name
+
+    def call(self, name, elapsed):
+        count, total = self.calls.get(name, (0, 0))
+        self.calls[name] = (count + 1, total + elapsed)
+
+    def finish(self, error):
+        # The branch is whichever branch stage the move was returned from;
+        # stages entered with branch=False after it don't replace it
+        branch = self.branch
+        self.enter(None)
+        return {
+            "round": self.round,
+            "total": self.stage_start - self.start,
+            "branch": branch,
+            "error": error,
+            "stages": self.stages,
+            "calls": {name: {"count": count, "time": total}
+                      for name, (count, total) in self.calls.items()},
+        }
+
+
+def _write(record):
+    global _out
+    if not output_path:
+        return
+    if _out is None:
+        _out = open(output_path, "a")
+    _out.write(json.dumps(record) + "\n")
+    _out.flush()
+
+
+def _stage(name, branch=True):
+    current = getattr(_local, "current", None)
+    if current is not None:
+        current.enter(name, branch)
+
+
+def _timed(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        current = getattr(_local, "current", None)
+        if current is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            current.call(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def _record(func):
+    # For get_move: one record per call, keyed by the state's round
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        global last
+        current = _Round(state.round)
+        _local.current = current
+        error = True
+        try:
+            move = func(state, *args, **kwargs)
+            error = False
+            return move
+        finally:
+            _local.current = None
+            last = current.finish(error)
+            _write(last)
+
+    return wrapper
+
+
+def _nothing(name, branch=True):
+    pass
+
+
+def _unchanged(func):
+    return func
+
+
+if ENABLED:
+    stage, timed, record = _stage, _timed, _record
+else:
+    stage, timed, record = _nothing, _unchanged, _unchanged
@@ -3,10 +3,25 @@
 # Mallin Moolman
 
 
-import json
+import re
 from pathlib import Path
 
-from state import State
+from state import State, Move, MoveType, Direction, Player, TYPE_CODES
+
+# C JSON parser, used when it is installed
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+
+# Cell types in file order, and the coordinates a cell starts with. A
+# powerup's own "type" isn't a cell type, so it isn't matched.
+_CELL_TYPE = re.compile(r'"type"\s*:\s*"(DIRT|AIR|LAVA|DEEP_SPACE)"')
+_CELL_HEAD = re.compile(r'"x"\s*:\s*(\d+)\s*,\s*"y"\s*:\s*(\d+)')
+_MAP_END = re.compile(r"\]\s*\]")
+
+_TYPE_CODES = {cell_type.value: code for cell_type, code in TYPE_CODES.items()}
 
 
 def move_to_string(move):
@@ -30,17 +45,66 @@ def move_to_string(move):
         return move_str + "{} {} {}".format(move.move_type.value, x, y)
 
 
+def parse_move(command, state, player=Player.SELF):
+    # Inverse of move_to_string, e.g. for previousCommand in a state file
+    select = None
+    if command.startswith("select"):
+        select_str, command = command.split(";", 1)
+        worms = state.own_worms if player == Player.SELF else state.opponent_worms
+        select = worms[int(select_str.split()[1]) - 1]
+
+    parts = command.split()
+    move_type = MoveType(parts[0])
+    if move_type == MoveType.SHOOT:
+        return Move(move_type, Direction(parts[1]), select)
+    if move_type == MoveType.NOTHING:
+        return Move(move_type)
+    return Move(move_type, (int(parts[1]), int(parts[2])), select)
+
+
 def output_move(round_num, move):
     move_str = move_to_string(move)
     print(f"C;{round_num};{move_str}")
 
 
-def load_path(file_path):
-    with file_path.open("r") as f:
-        json_state = json.load(f)
-        return State(json_state)
+def parse_state(text):
+    # Reads the map with one regex pass over the cell types instead of
+    # building a dict per cell, and only hands the rest of the file to the
+    # JSON parser. The engine writes the map row by row; if the first cells
+    # or the cell count say otherwise, the whole file is parsed normally.
+    key = text.find('"map"')
+    if key < 0:
+        return _loads(text)
+    start = text.index("[", key)
+    end = _MAP_END.search(text, start).end()
+    section = text[start:end]
+
+    js = _loads(text[:start] + "null" + text[end:])
+    size = js["mapSize"]
+    types = _CELL_TYPE.findall(section)
+    first = _CELL_HEAD.search(section)
+    second = first and _CELL_HEAD.search(section, first.end())
+    if (len(types) != size * size or first is None or second is None or
+            first.groups() != ("0", "0") or second.groups() != ("1", "0")):
+        return _loads(text)
+
+    powerups = []
+    found = section.find('"powerup"')
+    while found >= 0:
+        head = _CELL_HEAD.match(section, section.rfind('"x"', 0, found))
+        powerups.append((int(head.group(1)), int(head.group(2))))
+        found = section.find('"powerup"', found + 1)
+
+    js["codes"] = bytearray(map(_TYPE_CODES.__getitem__, types))
+    js["powerups"] = powerups
+    return js
+
+
+def load_path(file_path, previous=None):
+    # previous is last round's State, which lets unchanged cells be reused
+    return State(parse_state(file_path.read_text()), previous)
 
 
-def load_state(round_num):
+def load_state(round_num, previous=None):
     file_path = Path("./rounds/") / round_num / "state.json"
-    return load_path(file_path)
+    return load_path(file_path, previous)
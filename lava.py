@@ -0,0 +1,124 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import logging
+from bisect import bisect_right
+
+from rules import lava_radius, LAVA_START_ROUND
+import bitboard
+import geometry
+
+
+# From this round every dirt cell is hot as well
+DIRT_HOT_ROUND = 302
+
+# Schedules by geometry, so once per map layout
+_schedules = dict()
+
+mismatches = 0
+
+
+class Schedule:
+
+    # Where the lava is in any round, worked out from the map shape alone:
+    # every cell further from the centre than rules.lava_radius. Each
+    # round's lava, hot cells and nearest lava distance are worked out once
+    # and kept; rounds with the same radius share their masks.
+
+    def __init__(self, geo):
+        self.geo = geo
+        self._rounds = dict()
+        self._radii = dict()
+
+    def _round(self, round_number):
+        # (lava, hot cells before DIRT_HOT_ROUND, smallest squared distance
+        # to the centre of any lava cell or None)
+        if round_number in self._rounds:
+            return self._rounds[round_number]
+
+        geo = self.geo
+        radius = lava_radius(round_number, geo.size)
+        if radius is None:
+            entry = (0, 0, None)
+        else:
+            # Index into geo.d2_values of the last distance inside the radius
+            inside = bisect_right(geo.d2_values, radius ** 2) - 1
+            if inside not in self._radii:
+                kept = geo.d2_masks[inside] if inside >= 0 else 0
+                lava = geo.in_map_mask & ~kept
+                nearest = (geo.d2_values[inside + 1]
+                           if inside + 1 < len(geo.d2_values) else None)
+                self._radii[inside] = (lava, bitboard.dilate(geo, lava),
+                                       nearest)
+            entry = self._radii[inside]
+        self._rounds[round_number] = entry
+        return entry
+
+    def lava(self, round_number):
+        return self._round(round_number)[0]
+
+    def nearest_d2(self, round_number):
+        return self._round(round_number)[2]
+
+    def hot(self, round_number, dirt):
+        # Lava and everything next to it, and dirt too from DIRT_HOT_ROUND
+        if round_number < LAVA_START_ROUND:
+            return 0
+        lava, hot, _ = self._round(round_number)
+        if round_number >= DIRT_HOT_ROUND:
+            return dirt | lava
+        return hot
+
+
+def for_state(state):
+    geo = geometry.for_state(state)
+    if geo not in _schedules:
+        _schedules[geo] = Schedule(geo)
+    return _schedules[geo]
+
+
+def holds(state):
+    # Whether the schedule agrees with the lava actually on the map. States
+    # it doesn't are read by scanning their lava cells instead.
+    def check():
+        global mismatches
+        expected = for_state(state).lava(state.round)
+        if expected == bitboard.for_state(state).lava:
+            return True
+        mismatches += 1
+        logging.warning("Lava in round %d doesn't follow the schedule, "
+                        "scanning instead", state.round)
+        return False
+
+    return state.analysis.get(("lava_schedule",), check)
+
+
+def lava(state, ahead=0):
+    # Lava cells ahead rounds from now
+    if holds(state):
+        return for_state(state).lava(state.round + ahead)
+    return bitboard.for_state(state).lava
+
+
+def nearest_d2(state):
+    if holds(state):
+        return for_state(state).nearest_d2(state.round)
+    return bitboard.nearest_d2(geometry.for_state(state),
+                               bitboard.for_state(state).lava)
+
+
+def hot(state, ahead=0):
+    # Cells to keep off ahead rounds from now: from round 100 lava and
+    # everything next to it, and from round 302 dirt and lava. 0 before the
+    # lava starts. Dirt is taken as it is now.
+    round_number = state.round + ahead
+    if round_number < LAVA_START_ROUND:
+        return 0
+    boards = bitboard.for_state(state)
+    if holds(state):
+        return for_state(state).hot(round_number, boards.dirt)
+    if round_number >= DIRT_HOT_ROUND:
+        return boards.dirt | boards.lava
+    return bitboard.dilate(geometry.for_state(state), boards.lava)
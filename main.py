@@ -5,11 +5,16 @@
 
 import logging
 import sys
+import time
 from pathlib import Path
 
+import anytime
 import bot
+import endgame
 import history
 import interface
+import search
+import speculate
 
 
 logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
@@ -19,21 +24,37 @@ def run_bot():
     last_state = None
     last_move = None
     previous = None
+    speculator = speculate.Speculator()
 
     while True:
         try:
             round_num = input()
-
-            state = interface.load_state(round_num)
+            start = time.perf_counter()
+            speculator.stop()
+
+            # A search that missed its deadline may still be playing moves on
+            # last_state, so the new state is parsed in full rather than
+            # sharing its cells
+            shared = None if anytime.searching() else last_state
+            state = interface.load_state(round_num, shared)
             previous = history.calculate(last_state, state, last_move,
                                          previous)
             history.update_state(state, previous)
             last_state = state
+            speculator.adopt(state)
 
-            move = bot.get_move(state)
+            move = anytime.get_move(state, start)
             interface.output_move(round_num, move)
+            logging.info("Analysis cache: %s", state.analysis)
+            logging.info("Speculation: %s", speculator)
+            if bot.SEARCH_MODE:
+                logging.info("Search: %s", search.summary())
+            if bot.ENDGAME and endgame.solves:
+                logging.info("Endgame: %s", endgame.summary())
 
             last_move = move
+            if not anytime.searching():
+                speculator.start(state, move)
 
         except Exception as e:
             logging.exception(e)
@@ -44,7 +65,7 @@ def run_debug():
     file_path = Path(sys.argv[1])
     bananas = int(sys.argv[2])
     state = interface.load_path(file_path)
-    previous = history.DEFAULT
+    previous = dict(history.DEFAULT)
     previous["bananas_used"] = 3 - bananas
     history.update_state(state, previous)
     move = bot.get_move(state)
@@ -0,0 +1,181 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import threading
+from collections import OrderedDict
+
+from state import SPACE, DIRT, AIR, LAVA
+from rules import CENTRE
+import bitboard
+import geometry
+import lava
+
+
+# Turns it costs to step onto a cell: digging dirt first takes a turn, and
+# lava and hot cells count extra for the damage taken there. Deep space
+# (cost 0) can't be entered.
+COST = {SPACE: 0, AIR: 1, DIRT: 2, LAVA: 5}
+HOT_PENALTY = 2
+
+# Cells count as hot if they will be within this many rounds, since walks
+# take a few rounds
+HOT_LOOKAHEAD = 3
+
+UNREACHABLE = 1 << 30
+
+FIELD_CAPACITY = 32
+
+# Cost by cell code plus 4 for hot cells
+_COSTS = bytes((COST.get(code % 4, 0) + HOT_PENALTY * (code >= 4)
+                if COST.get(code % 4, 0) else 0) for code in range(256))
+_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+
+# Fields by map size and sources, reused across rounds and updated for the
+# cells that got cheaper
+_fields = OrderedDict()
+_lock = threading.Lock()
+
+
+class Field:
+
+    # Cost of the cheapest walk from every cell to the nearest source,
+    # indexed by position. Never changed once built, so a field can be
+    # shared between threads and states.
+
+    def __init__(self, sources, costs, dist, size):
+        self.sources = sources
+        self.costs = costs
+        self.dist = dist
+        self.size = size
+
+    def __getitem__(self, pos):
+        x, y = pos
+        return self.dist[y * self.size + x]
+
+
+def costs(state):
+    def compute():
+        # Adds 4 to the code of every hot cell in one go: each byte of the
+        # sum is at most 7, so nothing carries into the next cell
+        types = state.grid.types
+        n = len(types)
+        hot = format(lava.hot(state, HOT_LOOKAHEAD), f"0{n}b")[::-1].encode()
+        codes = (int.from_bytes(types, "little") +
+                 (int.from_bytes(hot.translate(_FLAGS), "little") << 2))
+        return codes.to_bytes(n, "little").translate(_COSTS)
+
+    return state.analysis.get(("path_costs",), compute)
+
+
+def _search(dist, seeds, cost, adjacent):
+    # Dijkstra from the seed cells, whose distances are already set. Costs
+    # are small ints, so cells wait in one list per distance (Dial's
+    # algorithm) instead of a heap. Stepping from a neighbour onto cell i
+    # costs cost[i], so each settled cell relaxes its neighbours by its own
+    # cost.
+    buckets = []
+    for i in seeds:
+        while len(buckets) <= dist[i]:
+            buckets.append([])
+        buckets[dist[i]].append(i)
+
+    d = 0
+    while d < len(buckets):
+        for i in buckets[d]:
+            if dist[i] != d:
+                continue
+            reached = d + cost[i]
+            for j in adjacent[i]:
+                if reached < dist[j]:
+                    dist[j] = reached
+                    while len(buckets) <= reached:
+                        buckets.append([])
+                    buckets[reached].append(j)
+        d += 1
+
+
+def _build(sources, cost, adjacent):
+    dist = [UNREACHABLE] * len(cost)
+    for i in sources:
+        dist[i] = 0
+    _search(dist, sources, cost, adjacent)
+    return dist
+
+
+def _update(old, cost, adjacent):
+    # Rework an old field for new costs, or None if any cost went up. Cells
+    # that got cheaper (dug dirt) can only shorten walks, so the search
+    # restarts from just those cells. Dearer cells (spreading lava) can
+    # lengthen walks anywhere downhill of them, and clearing and searching
+    # those again was measured slower than a fresh search.
+    old_cost = old.costs
+    changed = [i for i, (new, was) in enumerate(zip(cost, old_cost))
+               if new != was]
+    for i in changed:
+        if cost[i] == 0 or 0 < old_cost[i] < cost[i]:
+            return None
+
+    dist = old.dist[:]
+    seeds = []
+    for i in changed:
+        if dist[i] == UNREACHABLE:
+            # Was deep space: reachable through its neighbours now
+            best = min((dist[j] + cost[j] for j in adjacent[i]
+                        if dist[j] < UNREACHABLE), default=UNREACHABLE)
+            if best < UNREACHABLE:
+                dist[i] = best
+                seeds.append(i)
+        else:
+            seeds.append(i)
+    _search(dist, seeds, cost, adjacent)
+    return dist
+
+
+def _field(state, sources):
+    cost = costs(state)
+    size = state.grid.size
+    key = (size, sources)
+
+    with _lock:
+        old = _fields.get(key)
+        if old is not None:
+            _fields.move_to_end(key)
+    if old is not None and old.costs == cost:
+        return old
+
+    adjacent = geometry.for_state(state).adjacent()
+    dist = None
+    if old is not None:
+        dist = _update(old, cost, adjacent)
+    if dist is None:
+        dist = _build(sources, cost, adjacent)
+
+    field = Field(sources, cost, dist, size)
+    with _lock:
+        _fields[key] = field
+        _fields.move_to_end(key)
+        while len(_fields) > FIELD_CAPACITY:
+            _fields.popitem(last=False)
+    return field
+
+
+def from_cells(state, cells):
+    sources = tuple(sorted(state.grid.index(pos) for pos in cells))
+    return state.analysis.get(("field", sources),
+                              lambda: _field(state, sources))
+
+
+def from_centre(state):
+    return from_cells(state, [CENTRE])
+
+
+def from_worm(state, worm):
+    return from_cells(state, [worm.position])
+
+
+def from_powerups(state):
+    # One field for all powerups: the distance to the nearest one
+    return from_cells(state, bitboard.positions(
+        bitboard.for_state(state).powerups, state.grid.all_positions))
@@ -0,0 +1,201 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from state import Move, MoveType, Player, DIRT, AIR, LAVA
+from rules import CENTRE, GUN_DAMAGE, MAX_ROUNDS
+import geometry
+import lava
+import search
+
+
+# Worms head for the centre until they are this close (squared), then for
+# the weakest opponent
+CENTRE_D2 = 9
+
+# Rounds a playout runs before the position is evaluated
+PLAYOUT_ROUNDS = 10
+
+# Tables by geometry, so once per map layout
+_tables = dict()
+
+
+class Tables:
+
+    # Everything the policy reads about the map shape, by cell index: the
+    # neighbours, the gun rays and the cells between any two cells in gun
+    # range, squared distances and every command a worm there could give,
+    # already encoded
+
+    def __init__(self, geo):
+        size = geo.size
+        self.size = size
+        self.nothing = Move.encode(MoveType.NOTHING)
+        self.neighbours = dict()
+        self.moves = dict()
+        self.digs = dict()
+        self.rays = dict()
+        self.between = dict()
+        self.centre_d2 = dict()
+
+        for pos in geo.cells:
+            i = pos[1] * size + pos[0]
+            near = geo.neighbours[pos]
+            self.neighbours[i] = [y * size + x for x, y in near]
+            self.moves[i] = [Move.encode(MoveType.MOVE, p) for p in near]
+            self.digs[i] = [Move.encode(MoveType.DIG, p) for p in near]
+            self.centre_d2[i] = geo.centre_d2[pos]
+
+            rays = []
+            between = dict()
+            for direction, ray in geo.rays[pos].items():
+                cells = [y * size + x for x, y in ray]
+                rays.append((Move.encode(MoveType.SHOOT, direction), cells))
+                for n, j in enumerate(cells):
+                    between[j] = cells[:n]
+            self.rays[i] = rays
+            self.between[i] = between
+
+    def d2(self, i, j):
+        size = self.size
+        return (i % size - j % size) ** 2 + (i // size - j // size) ** 2
+
+
+def for_state(state):
+    geo = geometry.for_state(state)
+    if geo not in _tables:
+        _tables[geo] = Tables(geo)
+    return _tables[geo]
+
+
+def _worms(state, player):
+    if player == Player.SELF:
+        return state.current_worm, state.own_worms, state.opponent_worms
+    return state.opp_current_worm, state.opponent_worms, state.own_worms
+
+
+def _clear(types, worms, cells, subject):
+    # Whether a shot passes all of cells; the subject's own cell doesn't
+    # block, as it will have moved off it
+    for j in cells:
+        if types[j] != AIR or (worms[j] and j != subject):
+            return False
+    return True
+
+
+def policy(state, player=Player.SELF):
+    # The code of the command get_move's main rules would most likely give
+    # the player's current worm: off hot cells, shoot the weakest worm in
+    # line, step out of any opponent's line, dig, then walk towards the
+    # centre and, once there, the weakest opponent. Besides the hot cells,
+    # only the map arrays and per-layout tables are read.
+    worm, friends, enemies = _worms(state, player)
+    t = for_state(state)
+    if not worm.alive or worm.rounds_until_unfrozen > 0:
+        return t.nothing
+
+    grid = state.grid
+    types = grid.types
+    worms = grid.worms
+    slots = grid.slots
+    size = t.size
+    i = worm.y * size + worm.x
+    hot = lava.hot(state)
+    enemies = [w for w in enemies if w.alive]
+    opposed = [(w.y * size + w.x) for w in enemies]
+
+    def danger(cell):
+        between = t.between[cell]
+        return any(j in between and _clear(types, worms, between[j], i)
+                   for j in opposed)
+
+    # (code, cell, whether it is a dig) for every free cell and dirt next to
+    # the worm
+    steps = []
+    for k, j in enumerate(t.neighbours[i]):
+        code = types[j]
+        if (code == AIR or code == LAVA) and not worms[j]:
+            steps.append((t.moves[i][k], j, False))
+        elif code == DIRT:
+            steps.append((t.digs[i][k], j, True))
+
+    if hot >> i & 1:
+        cold = [s for s in steps if not s[2] and not hot >> s[1] & 1]
+        if cold:
+            return min(cold, key=lambda s: (danger(s[1]),
+                                            t.centre_d2[s[1]]))[0]
+        # Through the heat, and lava if need be, towards the centre
+        out = [s for s in steps if not s[2]] or steps
+        if out:
+            return min(out, key=lambda s: t.centre_d2[s[1]])[0]
+
+    # Shoot the weakest worm in line if none of them can shoot back before
+    # our next turn, or if engaging pays as in bot.should_engage: one
+    # target, weaker than us, while we lead
+    best, target, targets = None, None, 0
+    for code, ray in t.rays[i]:
+        for j in ray:
+            if types[j] != AIR:
+                break
+            if worms[j]:
+                hit = slots[worms[j]]
+                if hit.player != worm.player:
+                    targets += 1
+                    if target is None or hit.health < target.health:
+                        best, target = code, hit
+                break
+    if best is not None:
+        lead = state.own_score - state.opp_score
+        if player != Player.SELF:
+            lead = -lead
+        if (not any(w.active_before_next_turn for w in enemies) or
+                (targets == 1 and lead > 0 and
+                 GUN_DAMAGE <= worm.health and target.health < worm.health)):
+            return best
+
+    if danger(i):
+        safe = [s for s in steps if not s[2] and not hot >> s[1] & 1 and
+                not danger(s[1])]
+        if safe:
+            return min(safe, key=lambda s: t.centre_d2[s[1]])[0]
+        if best is not None:
+            return best
+
+    if t.centre_d2[i] > CENTRE_D2 or not enemies:
+        goal = CENTRE[1] * size + CENTRE[0]
+    else:
+        weakest = min(enemies, key=lambda w: w.health)
+        goal = weakest.y * size + weakest.x
+
+    # Any dirt next to the worm is dug, nearest the goal first
+    digs = [s for s in steps if s[2] and not hot >> s[1] & 1]
+    if digs:
+        return min(digs, key=lambda s: t.d2(s[1], goal))[0]
+
+    here = t.d2(i, goal)
+    closer = [s for s in steps if not hot >> s[1] & 1 and
+              t.d2(s[1], goal) < here]
+    if closer:
+        return min(closer, key=lambda s: t.d2(s[1], goal))[0]
+    return t.nothing
+
+
+def playout(state, rounds=PLAYOUT_ROUNDS):
+    # search.evaluate after both players follow the policy for rounds
+    # rounds, or until one side has no worms left. The state is left as it
+    # was.
+    played = 0
+    try:
+        while played < rounds and state.round <= MAX_ROUNDS:
+            if (not any(w.alive for w in state.own_worms) or
+                    not any(w.alive for w in state.opponent_worms)):
+                break
+            state.play(Move.from_code(policy(state), state.own_worms),
+                       Move.from_code(policy(state, Player.OPPONENT),
+                                      state.opponent_worms))
+            played += 1
+        return search.evaluate(state)
+    finally:
+        for _ in range(played):
+            state.undo()
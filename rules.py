@@ -0,0 +1,103 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from enum import Enum
+
+
+class Direction(Enum):
+    NW = "NW"
+    N = "N"
+    NE = "NE"
+    E = "E"
+    SE = "SE"
+    S = "S"
+    SW = "SW"
+    W = "W"
+
+
+DELTAS = {
+    Direction.NW: (-1, -1),
+    Direction.N: (0, -1),
+    Direction.NE: (1, -1),
+    Direction.W: (-1, 0),
+    Direction.E: (1, 0),
+    Direction.SW: (-1, 1),
+    Direction.S: (0, 1),
+    Direction.SE: (1, 1),
+}
+
+BANANA_DAMAGE = {
+    (-2, 0): 7,
+    (-1, -1): 11,
+    (-1, 0): 13,
+    (-1, 1): 11,
+    (0, -2): 7,
+    (0, -1): 13,
+    (0, 0): 20,
+    (0, 1): 13,
+    (0, 2): 7,
+    (1, -1): 11,
+    (1, 0): 13,
+    (1, 1): 11,
+    (2, 0): 7,
+}
+
+SNOWBALL_DELTAS = [
+    (-1, -1),
+    (-1, 0),
+    (-1, 1),
+    (0, -1),
+    (0, 0),
+    (0, 1),
+    (1, -1),
+    (1, 0),
+    (1, 1),
+]
+
+CENTRE = (16, 16)
+
+GUN_DAMAGE = 8
+HEALTH_PACK = 10
+FREEZE_DURATION = 5
+PUSHBACK_DAMAGE = 20
+LAVA_DAMAGE = 3
+
+MAX_ROUNDS = 400
+# Consecutive do-nothings the engine allows before disqualifying a player.
+# bot.MAX_DO_NOTHINGS is the bot's own, lower threshold.
+DO_NOTHING_LIMIT = 12
+
+# Lava closes in from the edge of the map between these rounds
+LAVA_START_ROUND = 100
+LAVA_END_ROUND = 340
+
+# Points per command, as close to the engine's scoring as the bot needs
+POINTS_MOVE = 5
+POINTS_DIG = 7
+POINTS_MISSED_SHOT = 2
+POINTS_KILL = 40
+POINTS_FREEZE = 17
+POINTS_POWERUP = 20
+POINTS_INVALID = -4
+
+# int(dist) <= 5 for bananas and snowballs, int(dist) <= 4 for the gun
+THROW_RANGE = 5
+GUN_RANGE = 4
+
+# Offsets within throwing range, in map order
+THROW_OFFSETS = [(dx, dy)
+                 for dy in range(-THROW_RANGE, THROW_RANGE + 1)
+                 for dx in range(-THROW_RANGE, THROW_RANGE + 1)
+                 if dx * dx + dy * dy < (THROW_RANGE + 1) ** 2]
+
+
+def lava_radius(round_number, size):
+    # Cells further than this from the centre are lava, or None before the
+    # lava starts
+    if round_number < LAVA_START_ROUND:
+        return None
+    progress = min(1, (round_number - LAVA_START_ROUND) /
+                   (LAVA_END_ROUND - LAVA_START_ROUND))
+    return (size / 2) * (1 - progress)
@@ -0,0 +1,238 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import logging
+import os
+import random
+import time
+
+from state import MoveType, Player
+from rules import LAVA_DAMAGE
+import candidates
+import lava
+
+
+# "maximin" or "mixed" to check get_move's choice with a one-ply search over
+# both players' commands, or empty to leave it alone
+MODE = os.environ.get("WORMS_SEARCH", "")
+
+# Seconds a search may take; rows not finished by then are left out
+BUDGET = float(os.environ.get("WORMS_SEARCH_BUDGET", "0.25"))
+
+# Throws and selects worth trying, best valued first, on top of every
+# move, dig and shot
+THROW_WIDTH = 3
+SELECT_WIDTH = 4
+
+# Payoff weights, in health points. A frozen worm misses its turns, lava
+# and hot cells cost the damage taken on them and score points only
+# break ties.
+WORM_VALUE = 30
+FROZEN_VALUE = 3
+HOT_COST = LAVA_DAMAGE
+SCORE_WEIGHT = 0.01
+
+# Fictitious play rounds for the mixed strategy
+ITERATIONS = 300
+
+nodes = 0
+seconds = 0.0
+searches = 0
+changed = 0
+
+
+def evaluate(state):
+    # Our advantage in the position: health and living worms, frozen turns,
+    # worms standing on hot cells and the score
+    hot = lava.hot(state)
+    index = state.grid.index
+    total = SCORE_WEIGHT * (state.own_score - state.opp_score)
+    for worms, sign in ((state.own_worms, 1), (state.opponent_worms, -1)):
+        for worm in worms:
+            if not worm.alive:
+                continue
+            value = worm.health + WORM_VALUE
+            value -= FROZEN_VALUE * worm.rounds_until_unfrozen
+            if hot >> index(worm.position) & 1:
+                value -= HOT_COST
+            total += sign * value
+    return total
+
+
+def plausible(state, player, extra=()):
+    # Commands worth a row or column: every move, dig and shot and doing
+    # nothing, the best few throws of each kind and, for us, the best few
+    # selects. Best valued first, after any extra commands.
+    found = candidates.score(state, candidates.generate(state, player))
+    found.sort(key=candidates.Candidate.value, reverse=True)
+
+    chosen = []
+    throws = {MoveType.BANANA: 0, MoveType.SNOWBALL: 0}
+    selects = 0
+    for c in found:
+        if c.select:
+            if player != Player.SELF or selects >= SELECT_WIDTH:
+                continue
+            selects += 1
+        elif c.move_type in throws:
+            if throws[c.move_type] >= THROW_WIDTH:
+                continue
+            throws[c.move_type] += 1
+        chosen.append(c.move())
+
+    codes = set(m.code() for m in extra)
+    return list(extra) + [m for m in chosen if m.code() not in codes]
+
+
+class Matrix:
+
+    # Payoffs of our commands (rows) against the opponent's (columns), each
+    # found by playing the pair on the state and evaluating the result.
+    # Rows that aren't finished before the deadline stay None.
+
+    def __init__(self, state, rows, columns, deadline):
+        self.state = state
+        self.rows = rows
+        self.columns = columns
+        self.deadline = deadline
+        self.payoffs = [None] * len(rows)
+        self.nodes = 0
+
+    def payoff(self, row, column):
+        state = self.state
+        state.play(self.rows[row], self.columns[column])
+        try:
+            return evaluate(state)
+        finally:
+            state.undo()
+            self.nodes += 1
+
+    def maximin(self):
+        # Index of the row whose worst case is best, the earliest of any
+        # ties. A row is dropped as soon as one column makes it no better
+        # than the best so far, so strong replies are tried first.
+        best, best_value = None, None
+        for row in range(len(self.rows)):
+            if time.perf_counter() > self.deadline:
+                break
+            worst = None
+            payoffs = []
+            for column in range(len(self.columns)):
+                value = self.payoff(row, column)
+                payoffs.append(value)
+                if worst is None or value < worst:
+                    worst = value
+                if best_value is not None and worst <= best_value:
+                    break
+            else:
+                self.payoffs[row] = payoffs
+                if best_value is None or worst > best_value:
+                    best, best_value = row, worst
+        return best, best_value
+
+    def fill(self):
+        for row in range(len(self.rows)):
+            if time.perf_counter() > self.deadline:
+                break
+            self.payoffs[row] = [self.payoff(row, column)
+                                 for column in range(len(self.columns))]
+
+    def mixed(self):
+        # Row probabilities of an approximate equilibrium: strictly
+        # dominated rows and columns are removed until none are left, then
+        # fictitious play runs on what remains
+        rows = [r for r, payoffs in enumerate(self.payoffs)
+                if payoffs is not None]
+        columns = list(range(len(self.columns)))
+        if not rows:
+            return dict()
+        rows, columns = _undominated(self.payoffs, rows, columns)
+
+        row_totals = dict.fromkeys(columns, 0)
+        column_totals = dict.fromkeys(rows, 0)
+        row_counts = dict.fromkeys(rows, 0)
+        row, column = rows[0], columns[0]
+        for _ in range(ITERATIONS):
+            row_counts[row] += 1
+            for c in columns:
+                row_totals[c] += self.payoffs[row][c]
+            for r in rows:
+                column_totals[r] += self.payoffs[r][column]
+            # Each player answers the other's history so far
+            column = min(columns, key=row_totals.get)
+            row = max(rows, key=column_totals.get)
+        return {r: count / ITERATIONS for r, count in row_counts.items()
+                if count}
+
+
+def _undominated(payoffs, rows, columns):
+    # We want high payoffs and the opponent low ones
+    changed = True
+    while changed:
+        changed = False
+        for r in rows:
+            if any(all(payoffs[o][c] > payoffs[r][c] for c in columns)
+                   for o in rows if o != r):
+                rows = [o for o in rows if o != r]
+                changed = True
+                break
+        for c in columns:
+            if any(all(payoffs[r][o] < payoffs[r][c] for r in rows)
+                   for o in columns if o != c):
+                columns = [o for o in columns if o != c]
+                changed = True
+                break
+    return rows, columns
+
+
+def choose(state, move, mode=MODE, deadline=None):
+    # get_move's move, or a better one by the search. move is always the
+    # first row, so maximin keeps it unless another row does strictly
+    # better. The search stops after BUDGET seconds, or at deadline if that
+    # is sooner.
+    global nodes, seconds, searches, changed
+
+    if not state.valid(move):
+        return move
+
+    start = time.perf_counter()
+    rows = plausible(state, Player.SELF, [move])
+    columns = plausible(state, Player.OPPONENT)
+    end = start + BUDGET
+    if deadline is not None:
+        end = min(end, deadline)
+    matrix = Matrix(state, rows, columns, end)
+
+    if mode == "mixed":
+        matrix.fill()
+        strategy = matrix.mixed()
+        if strategy:
+            row = random.choices(list(strategy), list(strategy.values()))[0]
+        else:
+            row = 0
+    else:
+        row, _ = matrix.maximin()
+        if row is None:
+            row = 0
+
+    elapsed = time.perf_counter() - start
+    nodes += matrix.nodes
+    seconds += elapsed
+    searches += 1
+    if row != 0:
+        changed += 1
+    logging.info("Search: %d x %d, %d nodes in %.1f ms, chose %s over %s",
+                 len(rows), len(columns), matrix.nodes, elapsed * 1000,
+                 rows[row], move)
+    return rows[row]
+
+
+def rate():
+    return nodes / seconds if seconds else 0
+
+
+def summary():
+    return (f"{searches} searches, {nodes} nodes, {rate():.0f} nodes/s, "
+            f"{changed} moves changed")
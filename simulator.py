@@ -0,0 +1,439 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import argparse
+import importlib
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+import history
+import interface
+from state import State, Move, MoveType, Player, Profession, CODE_TYPES
+from rules import (MAX_ROUNDS, DO_NOTHING_LIMIT, POINTS_INVALID, GUN_DAMAGE,
+                   GUN_RANGE, THROW_RANGE, FREEZE_DURATION, HEALTH_PACK, CENTRE)
+
+
+MAP_SIZE = 33
+MAP_RADIUS = 16
+DIRT_CHANCE = 0.45
+POWERUPS = 2
+SELECTS = 5
+
+WORMS = [
+    (Profession.COMMANDO, 150),
+    (Profession.AGENT, 100),
+    (Profession.TECHNOLOGIST, 100),
+]
+
+
+def generate(seed=None):
+    # A random round 1 state file from the first player's point of view.
+    # The second player's half of the map is a mirror image of the first.
+    rnd = random.Random(seed)
+    cx, cy = CENTRE
+
+    types = dict()
+    for y in range(MAP_SIZE):
+        for x in range(MAP_SIZE):
+            if x > cx:
+                types[(x, y)] = types[(2 * cx - x, y)]
+            elif (x - cx) ** 2 + (y - cy) ** 2 > MAP_RADIUS ** 2:
+                types[(x, y)] = "DEEP_SPACE"
+            elif rnd.random() < DIRT_CHANCE:
+                types[(x, y)] = "DIRT"
+            else:
+                types[(x, y)] = "AIR"
+
+    # Worms start in clearings on the left of the map, opponents opposite
+    starts = []
+    while len(starts) < len(WORMS):
+        x = rnd.randint(cx - 12, cx - 3)
+        y = rnd.randint(cy - 12, cy + 12)
+        if (x - cx) ** 2 + (y - cy) ** 2 > (MAP_RADIUS - 3) ** 2:
+            continue
+        if any(abs(x - sx) < 4 and abs(y - sy) < 4 for sx, sy in starts):
+            continue
+        starts.append((x, y))
+    for x, y in starts:
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                types[(x + dx, y + dy)] = "AIR"
+                types[(2 * cx - x - dx, y + dy)] = "AIR"
+
+    powerups = set()
+    while len(powerups) < POWERUPS:
+        x = rnd.randint(cx - 4, cx - 1)
+        y = rnd.randint(cy - 4, cy + 4)
+        types[(x, y)] = "AIR"
+        types[(2 * cx - x, y)] = "AIR"
+        powerups.update([(x, y), (2 * cx - x, y)])
+
+    def worms(positions):
+        return [{
+            "id": i + 1,
+            "health": health,
+            "position": {"x": x, "y": y},
+            "roundsUntilUnfrozen": 0,
+            "profession": profession.value,
+        } for i, ((profession, health), (x, y)) in enumerate(zip(WORMS,
+                                                                  positions))]
+
+    own = worms(starts)
+    opponent = worms([(2 * cx - x, y) for x, y in starts])
+    for js_worm in own:
+        if js_worm["profession"] == Profession.AGENT.value:
+            js_worm["bananaBombs"] = {"count": 3}
+        if js_worm["profession"] == Profession.TECHNOLOGIST.value:
+            js_worm["snowballs"] = {"count": 3}
+
+    def player(worms):
+        return {
+            "score": 0,
+            "currentWormId": 1,
+            "remainingWormSelections": SELECTS,
+            "previousCommand": "nothing",
+            "worms": worms,
+        }
+
+    cells = []
+    for y in range(MAP_SIZE):
+        row = []
+        for x in range(MAP_SIZE):
+            cell = {"x": x, "y": y, "type": types[(x, y)]}
+            if (x, y) in powerups:
+                cell["powerup"] = {"type": "HEALTH_PACK", "value": HEALTH_PACK}
+            row.append(cell)
+        cells.append(row)
+
+    return {
+        "currentRound": 1,
+        "maxRounds": MAX_ROUNDS,
+        "mapSize": MAP_SIZE,
+        "consecutiveDoNothingCount": 0,
+        "myPlayer": player(own),
+        "opponents": [player(opponent)],
+        "map": cells,
+    }
+
+
+class Match:
+
+    # The real game, kept as a State from the first player's point of view.
+    # The opponent's ammo in it is exact because every command is played on
+    # it, unlike a State loaded from the opponent's point of view.
+
+    def __init__(self, js):
+        self.world = State(js)
+        self.do_nothings = {Player.SELF: js["consecutiveDoNothingCount"],
+                            Player.OPPONENT: 0}
+        self.previous = {Player.SELF: js["myPlayer"]["previousCommand"],
+                         Player.OPPONENT: js["opponents"][0]["previousCommand"]}
+        self.disqualified = None
+
+    def worms(self, player):
+        if player == Player.SELF:
+            return self.world.own_worms
+        else:
+            return self.world.opponent_worms
+
+    def to_json(self, player):
+        # The state file the engine would give player
+        world = self.world
+        opponent = Player.OPPONENT if player == Player.SELF else Player.SELF
+        scores = {Player.SELF: world.own_score,
+                  Player.OPPONENT: world.opp_score}
+        current = {Player.SELF: world.current_worm,
+                   Player.OPPONENT: world.opp_current_worm}
+        selects = {Player.SELF: world.selects_remaining,
+                   Player.OPPONENT: world.opp_selects_remaining}
+        ids = {player: 1, opponent: 2}
+
+        def worm_js(worm, own):
+            js_worm = {
+                "id": worm.id + 1,
+                "health": worm.health,
+                "position": {"x": worm.x, "y": worm.y},
+                "diggingRange": 1,
+                "movementRange": 1,
+                "roundsUntilUnfrozen": worm.rounds_until_unfrozen,
+                "profession": worm.profession.value,
+            }
+            if own:
+                js_worm["weapon"] = {"damage": GUN_DAMAGE, "range": GUN_RANGE}
+                if worm.profession == Profession.AGENT:
+                    js_worm["bananaBombs"] = {"damage": 20,
+                                              "range": THROW_RANGE,
+                                              "count": worm.bananas,
+                                              "damageRadius": 2}
+                if worm.profession == Profession.TECHNOLOGIST:
+                    js_worm["snowballs"] = {"freezeDuration": FREEZE_DURATION,
+                                            "range": THROW_RANGE,
+                                            "count": worm.snowballs,
+                                            "freezeRadius": 1}
+            return js_worm
+
+        def player_js(p, own):
+            worms = self.worms(p)
+            return {
+                "id": ids[p],
+                "score": scores[p],
+                "health": sum(max(w.health, 0) for w in worms),
+                "currentWormId": current[p].id + 1,
+                "remainingWormSelections": selects[p],
+                "previousCommand": self.previous[p],
+                "worms": [worm_js(w, own) for w in worms],
+            }
+
+        grid = world.grid
+        names = [cell_type.value for cell_type in CODE_TYPES]
+        cells = []
+        i = 0
+        for y in range(grid.size):
+            row = []
+            for x in range(grid.size):
+                cell = {"x": x, "y": y, "type": names[grid.types[i]]}
+                if grid.worms[i]:
+                    worm = grid.slots[grid.worms[i]]
+                    cell["occupier"] = {
+                        "id": worm.id + 1,
+                        "playerId": ids[worm.player],
+                        "health": worm.health,
+                        "position": {"x": x, "y": y},
+                    }
+                if grid.powerups[i]:
+                    cell["powerup"] = {"type": "HEALTH_PACK",
+                                       "value": HEALTH_PACK}
+                row.append(cell)
+                i += 1
+            cells.append(row)
+
+        return {
+            "currentRound": world.round,
+            "maxRounds": MAX_ROUNDS,
+            "mapSize": grid.size,
+            "currentWormId": current[player].id + 1,
+            "consecutiveDoNothingCount": self.do_nothings[player],
+            "myPlayer": player_js(player, True),
+            "opponents": [player_js(opponent, False)],
+            "map": cells,
+        }
+
+    def step(self, own_move, opp_move):
+        # Moves are from each player's own State; select refers to a worm id
+        world = self.world
+        commands = dict()
+        for player, move in ((Player.SELF, own_move),
+                             (Player.OPPONENT, opp_move)):
+            if move.select is not None:
+                move = Move(move.move_type, move.target,
+                            self.worms(player)[move.select.id])
+
+            if player == Player.SELF:
+                worm = world.current_worm
+            else:
+                worm = world.opp_current_worm
+
+            if not world.valid(move, worm):
+                logging.info("Invalid command from %s: %s", player.value, move)
+                if player == Player.SELF:
+                    world.own_score += POINTS_INVALID
+                else:
+                    world.opp_score += POINTS_INVALID
+                move = Move(MoveType.NOTHING)
+
+            if move.move_type == MoveType.NOTHING:
+                self.do_nothings[player] += 1
+                if self.do_nothings[player] > DO_NOTHING_LIMIT:
+                    self.disqualified = player
+            else:
+                self.do_nothings[player] = 0
+
+            self.previous[player] = interface.move_to_string(move)
+            commands[player] = move
+
+        world.play(commands[Player.SELF], commands[Player.OPPONENT])
+        world.commit()
+
+    def finished(self):
+        return (self.disqualified is not None or
+                self.world.round > MAX_ROUNDS or
+                not any(w.alive for w in self.world.own_worms) or
+                not any(w.alive for w in self.world.opponent_worms))
+
+    def winner(self):
+        # Player.SELF, Player.OPPONENT or None for a draw
+        if self.disqualified is not None:
+            return (Player.OPPONENT if self.disqualified == Player.SELF
+                    else Player.SELF)
+
+        own_alive = any(w.alive for w in self.world.own_worms)
+        opp_alive = any(w.alive for w in self.world.opponent_worms)
+        if own_alive != opp_alive:
+            return Player.SELF if own_alive else Player.OPPONENT
+
+        world = self.world
+        own = (world.own_score, sum(max(w.health, 0) for w in world.own_worms))
+        opp = (world.opp_score,
+               sum(max(w.health, 0) for w in world.opponent_worms))
+        if own == opp:
+            return None
+        return Player.SELF if own > opp else Player.OPPONENT
+
+
+class Bot:
+
+    # Runs a bot module the way main.run_bot does, timing each get_move
+
+    def __init__(self, module):
+        self.module = module
+        self.last_state = None
+        self.last_move = None
+        self.previous = None
+        self.times = []
+
+    def get_move(self, js):
+        state = State(js, self.last_state)
+        self.previous = history.calculate(self.last_state, state,
+                                          self.last_move, self.previous)
+        history.update_state(state, self.previous)
+
+        start = time.perf_counter()
+        try:
+            move = self.module.get_move(state)
+        except Exception as e:
+            logging.exception(e)
+            move = Move(MoveType.NOTHING)
+        self.times.append(time.perf_counter() - start)
+
+        self.last_state = state
+        self.last_move = move
+        return move
+
+
+def play_match(own_module, opp_module, js=None, seed=None, save=None):
+    # seed picks the map and seeds random for the bots' own choices, as
+    # benchmark.replay does, so a seed replays the whole match
+    random.seed(seed)
+    if js is None:
+        js = generate(seed)
+    match = Match(js)
+    bots = {Player.SELF: Bot(own_module), Player.OPPONENT: Bot(opp_module)}
+
+    while not match.finished():
+        moves = dict()
+        for player, bot in bots.items():
+            js = match.to_json(player)
+            if save is not None:
+                write_round(Path(save) / player.value, js)
+            moves[player] = bot.get_move(js)
+        match.step(moves[Player.SELF], moves[Player.OPPONENT])
+
+    world = match.world
+    winner = match.winner()
+    return {
+        "winner": None if winner is None else winner.value,
+        "rounds": world.round - 1,
+        "own_score": world.own_score,
+        "opp_score": world.opp_score,
+        "own_health": sum(max(w.health, 0) for w in world.own_worms),
+        "opp_health": sum(max(w.health, 0) for w in world.opponent_worms),
+        "own_times": bots[Player.SELF].times,
+        "opp_times": bots[Player.OPPONENT].times,
+    }
+
+
+def write_round(rounds_dir, js):
+    # Same layout as the engine, so interface.load_path can read it back
+    path = Path(rounds_dir) / str(js["currentRound"]) / "state.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as f:
+        json.dump(js, f)
+
+
+def verify(rounds_dir):
+    # Replay recorded engine rounds and list where the simulator disagrees
+    rounds = sorted((p for p in Path(rounds_dir).iterdir()
+                     if (p / "state.json").exists()),
+                    key=lambda p: int(p.name))
+    mismatches = []
+    for before, after in zip(rounds, rounds[1:]):
+        if int(after.name) != int(before.name) + 1:
+            continue
+        with (before / "state.json").open() as f:
+            match = Match(json.load(f))
+        with (after / "state.json").open() as f:
+            js_after = json.load(f)
+        expected = State(js_after)
+
+        world = match.world
+        own_move = interface.parse_move(
+            js_after["myPlayer"]["previousCommand"], world)
+        opp_move = interface.parse_move(
+            js_after["opponents"][0]["previousCommand"], world,
+            Player.OPPONENT)
+        world.play(own_move, opp_move)
+
+        for pos, cell in expected.map.items():
+            if world.map[pos].type != cell.type:
+                mismatches.append((after.name, pos, world.map[pos].type,
+                                   cell.type))
+        for sim_worm, worm in zip(world.own_worms + world.opponent_worms,
+                                  expected.own_worms + expected.opponent_worms):
+            for attr in ("position", "health", "rounds_until_unfrozen"):
+                if getattr(sim_worm, attr) != getattr(worm, attr):
+                    mismatches.append((after.name, str(worm), attr,
+                                       getattr(sim_worm, attr),
+                                       getattr(worm, attr)))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play bots against each other")
+    parser.add_argument("--own", default="bot", help="module of the first bot")
+    parser.add_argument("--opponent", default="bot",
+                        help="module of the second bot")
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first match, the rest count up; "
+                             "it fixes both the map and the bots' random "
+                             "choices")
+    parser.add_argument("--save", help="write every round's state files here")
+    parser.add_argument("--verify", help="check the rules against a rounds "
+                                         "directory recorded by the engine")
+    parser.add_argument("--endgame", action="store_true",
+                        help="let the bots run the endgame solver, which is "
+                             "off otherwise whatever WORMS_ENDGAME says")
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+
+    if args.verify:
+        mismatches = verify(args.verify)
+        for mismatch in mismatches:
+            print(*mismatch)
+        print(f"{len(mismatches)} mismatches")
+        return
+
+    own = importlib.import_module(args.own)
+    opponent = importlib.import_module(args.opponent)
+    for module in (own, opponent):
+        if hasattr(module, "ENDGAME"):
+            module.ENDGAME = args.endgame
+    start = time.perf_counter()
+    for i in range(args.matches):
+        save = None if args.save is None else Path(args.save) / str(i)
+        result = play_match(own, opponent, seed=args.seed + i, save=save)
+        del result["own_times"], result["opp_times"]
+        print(json.dumps(result))
+    elapsed = time.perf_counter() - start
+    print(f"{args.matches} matches in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import logging
+import threading
+
+import bot
+import threat
+from state import Move, MoveType, Direction
+
+
+def signature(state):
+    # Everything the cached analysis depends on: the map, every worm and
+    # whose turn it is
+    return state.zobrist_hash()
+
+
+def opponent_moves(state):
+    # The opponent's current worm doing anything but throwing or selecting
+    worm = state.opp_current_worm
+    if worm.rounds_until_unfrozen > 0:
+        return [Move(MoveType.NOTHING)]
+    return (bot.valid_moves(state, worm) +
+            [Move(MoveType.SHOOT, direction) for direction in Direction])
+
+
+def warm(state):
+    # The analysis get_move asks for on nearly every round
+    for worm in state.own_worms:
+        if worm.alive:
+            threat.for_state(state, worm)
+    bot.danger_to_current_worm(state)
+    bot.dangerous_cells(state)
+    if state.selects_remaining > 0:
+        bot.get_select_move(state)
+
+
+class Speculator:
+
+    # Uses the time spent waiting for the next round to analyse the states
+    # it could bring: our move played against each likely opponent move.
+    # The analysis caches are kept by state signature, and the next round's
+    # state takes over the one that matches exactly.
+
+    def __init__(self):
+        self.cache = dict()
+        self.hits = 0
+        self.misses = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, state, move):
+        self.stop()
+        self.cache = dict()
+        if not state.valid(move):
+            move = Move(MoveType.NOTHING)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(state, move),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Must be called before the state given to start is used again
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def adopt(self, state):
+        analysis = self.cache.get(signature(state))
+        self.cache = dict()
+        if analysis is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        state.analysis = analysis
+        return True
+
+    def run(self, state, move):
+        # Speculate to completion on this thread
+        self.cache = dict()
+        self._stop.clear()
+        self._run(state, move)
+
+    def _run(self, state, move):
+        try:
+            for opp_move in opponent_moves(state):
+                if self._stop.is_set():
+                    break
+                state.play(move, opp_move)
+                try:
+                    key = signature(state)
+                    if key not in self.cache:
+                        warm(state)
+                        self.cache[key] = state.analysis
+                finally:
+                    state.undo()
+        except Exception as e:
+            logging.exception(e)
+
+    def __str__(self):
+        return f"{self.hits} hits, {self.misses} misses"
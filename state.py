@@ -5,6 +5,14 @@
 
 from enum import Enum
 
+from cache import AnalysisCache
+from rules import (Direction, BANANA_DAMAGE, SNOWBALL_DELTAS, THROW_RANGE,
+                   GUN_DAMAGE, HEALTH_PACK, FREEZE_DURATION, PUSHBACK_DAMAGE,
+                   LAVA_DAMAGE, POINTS_MOVE, POINTS_DIG, POINTS_MISSED_SHOT,
+                   POINTS_KILL, POINTS_FREEZE, POINTS_POWERUP, lava_radius)
+import geometry
+import zobrist
+
 
 class MoveType(Enum):
     NOTHING = "nothing"
@@ -33,24 +41,107 @@ class Profession(Enum):
     TECHNOLOGIST = "Technologist"
 
 
-class Direction(Enum):
-    NW = "NW"
-    N = "N"
-    NE = "NE"
-    E = "E"
-    SE = "SE"
-    S = "S"
-    SW = "SW"
-    W = "W"
+# Integer cell codes used by the flat grid arrays
+SPACE = 0
+DIRT = 1
+AIR = 2
+LAVA = 3
+
+TYPE_CODES = {
+    CellType.SPACE: SPACE,
+    CellType.DIRT: DIRT,
+    CellType.AIR: AIR,
+    CellType.LAVA: LAVA,
+}
+
+CODE_TYPES = [CellType.SPACE, CellType.DIRT, CellType.AIR, CellType.LAVA]
+
+# Codes by the engine's type names
+_NAME_CODES = {cell_type.value: code for cell_type, code in TYPE_CODES.items()}
+
+# Maps every non-space code to 1, leaving only the deep space layout
+_LAYOUT_TABLE = bytes([0] + [1] * 255)
+
+# Turns cell codes into "1" for lava and "0" otherwise
+_LAVA_DIGITS = bytes(ord("1") if code == LAVA else ord("0")
+                     for code in range(256))
+
+
+def map_codes(js):
+    # The map as (size, row-major bytearray of cell codes, powerup
+    # positions). interface.parse_state reads these straight from the file.
+    if js.get("map") is None:
+        return js["mapSize"], js["codes"], js["powerups"]
+
+    size = len(js["map"])
+    codes = bytearray(size * size)
+    powerups = []
+    for row in js["map"]:
+        for cell in row:
+            codes[cell["y"] * size + cell["x"]] = _NAME_CODES[cell["type"]]
+            if "powerup" in cell:
+                powerups.append((cell["x"], cell["y"]))
+    return size, codes, powerups
+
+
+def worm_slot(worm):
+    # Own worms occupy slots 1-3, opponent worms 4-6; 0 is an empty cell
+    if worm.player == Player.SELF:
+        return worm.id + 1
+    else:
+        return worm.id + 4
+
+
+# Enum members by value and by themselves, to skip Enum's lookup machinery
+_CELL_TYPES = {**{t.value: t for t in CellType}, **{t: t for t in CellType}}
+_PROFESSIONS = {**{p.value: p for p in Profession},
+                **{p: p for p in Profession}}
+
+_MOVE_TYPES = list(MoveType)
+_DIRECTIONS = list(Direction)
 
 
 class Move:
 
+    __slots__ = ("move_type", "target", "select")
+
     def __init__(self, move_type, target=None, select=None):
         self.move_type = move_type
         self.target = target
         self.select = select
 
+    def code(self):
+        return Move.encode(self.move_type, self.target, self.select)
+
+    @staticmethod
+    def encode(move_type, target=None, select=None):
+        # A move as one int: type, then the target's kind (none, cell or
+        # direction) and value, then the selected worm's id + 1
+        if target is None:
+            kind, a, b = 0, 0, 0
+        elif isinstance(target, tuple):
+            kind, (a, b) = 1, target
+        else:
+            kind, a, b = 2, _DIRECTIONS.index(target), 0
+        select = 0 if select is None else select.id + 1
+        return (_MOVE_TYPES.index(move_type) | kind << 3 | a << 5 |
+                b << 11 | select << 17)
+
+    @staticmethod
+    def from_code(code, worms):
+        # worms are the selecting player's, by id
+        kind = code >> 3 & 3
+        a = code >> 5 & 63
+        if kind == 0:
+            target = None
+        elif kind == 1:
+            target = (a, code >> 11 & 63)
+        else:
+            target = _DIRECTIONS[a]
+        select = code >> 17
+        return Move(_MOVE_TYPES[code & 7], target,
+                    worms[select - 1] if select else None)
+
     def __str__(self):
         if self.target is None:
             return f"{self.move_type.value}"
@@ -66,17 +157,24 @@ class Move:
 
 class Cell:
 
+    __slots__ = ("x", "y", "position", "type", "worm", "powerup")
+
     def __init__(self, x, y, type_str):
         self.x = x
         self.y = y
         self.position = (x, y)
-        self.type = CellType(type_str)
+        self.type = _CELL_TYPES[type_str]
         self.worm = None
         self.powerup = None
 
 
 class Worm:
 
+    __slots__ = ("x", "y", "position", "health", "alive", "active", "bananas",
+                 "snowballs", "turns_till_active", "profession",
+                 "rounds_until_unfrozen", "id", "player",
+                 "active_before_next_turn")
+
     def __init__(self, x, y, health, id_, profession, ruf, player):
         self.x = x
         self.y = y
@@ -87,7 +185,7 @@ class Worm:
         self.bananas = 0
         self.snowballs = 0
         self.turns_till_active = None
-        self.profession = Profession(profession)
+        self.profession = _PROFESSIONS[profession]
         self.rounds_until_unfrozen = ruf
 
         self.id = id_
@@ -102,9 +200,68 @@ class Worm:
         return self.__str__()
 
 
+class Grid:
+
+    # Dense row-major arrays for the map. Index of (x, y) is y * size + x.
+
+    _all_positions = dict()
+
+    def __init__(self, size):
+        self.size = size
+        if size not in Grid._all_positions:
+            Grid._all_positions[size] = [(x, y) for y in range(size)
+                                         for x in range(size)]
+        self.all_positions = Grid._all_positions[size]
+        self.types = bytearray(size * size)
+        self.worms = bytearray(size * size)
+        self.powerups = bytearray(size * size)
+        self.slots = [None] * 7
+
+    def index(self, pos):
+        x, y = pos
+        return y * self.size + x
+
+    def position(self, i):
+        return (i % self.size, i // self.size)
+
+    def in_map(self, pos):
+        x, y = pos
+        return (0 <= x < self.size and 0 <= y < self.size and
+                self.types[y * self.size + x] != SPACE)
+
+    def code(self, pos):
+        x, y = pos
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return self.types[y * self.size + x]
+        return SPACE
+
+    def cell_type(self, pos):
+        return CODE_TYPES[self.code(pos)]
+
+    def worm_at(self, pos):
+        x, y = pos
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return self.slots[self.worms[y * self.size + x]]
+        return None
+
+    def place_worm(self, worm):
+        slot = worm_slot(worm)
+        self.slots[slot] = worm
+        self.worms[self.index(worm.position)] = slot
+
+    def remove_worm(self, worm):
+        self.slots[worm_slot(worm)] = None
+        self.worms[self.index(worm.position)] = 0
+
+    def positions(self, code):
+        # All cells of one type, in map order
+        return [pos for pos, t in zip(self.all_positions, self.types)
+                if t == code]
+
+
 class State:
 
-    def __init__(self, js):
+    def __init__(self, js, previous=None):
         self.round = js["currentRound"]
         self.consecutive_do_nothings = js["consecutiveDoNothingCount"]
 
@@ -122,14 +279,23 @@ class State:
 
         self.opp_previous_command = js_opponent["previousCommand"]
 
-        self.map = dict()
-        for row in js["map"]:
-            for cell in row:
-                if cell["type"] != "DEEP_SPACE":
-                    c = Cell(cell["x"], cell["y"], cell["type"])
-                    if "powerup" in cell:
-                        c.powerup = True
-                    self.map[(cell["x"], cell["y"])] = c
+        # The grid arrays are the primary map; self.map is a view of the
+        # same cells as Cell objects for code that still works on positions
+        size, codes, powerups = map_codes(js)
+        self.grid = Grid(size)
+        self.geometry = None
+        self.zobrist = zobrist.for_size(size)
+        self.analysis = AnalysisCache()
+        self._frames = []
+
+        # Cells whose type changed since round changed_since, with their old
+        # types. Only known when built from the previous state.
+        self.changed_cells = None
+        self.changed_since = None
+
+        if (previous is None or previous.grid.size != size or
+                not self._update_map(previous, codes, powerups, js)):
+            self._read_map(codes, powerups)
 
         # Own worms
         self.own_worms = []
@@ -149,6 +315,7 @@ class State:
                 w.snowballs = js_worm["snowballs"]["count"]
             if w.health > 0:
                 self.map[(js_worm["position"]["x"], js_worm["position"]["y"])].worm = w
+                self.grid.place_worm(w)
 
         # Opponent worms
         self.opponent_worms = []
@@ -168,6 +335,114 @@ class State:
                 w.snowballs = 3  # updated later
             if w.health > 0:
                 self.map[(js_worm["position"]["x"], js_worm["position"]["y"])].worm = w
+                self.grid.place_worm(w)
+
+        self._update_turn_order()
+
+    def _read_map(self, codes, powerups):
+        grid = self.grid
+        grid.types[:] = codes
+        self.map = dict()
+        for pos, code in zip(grid.all_positions, codes):
+            if code:
+                self.map[pos] = Cell(pos[0], pos[1], CODE_TYPES[code])
+        for pos in powerups:
+            self.map[pos].powerup = True
+            grid.powerups[grid.index(pos)] = 1
+        self.map_hash = self.zobrist.map_hash(grid.types, grid.powerups)
+
+    def _update_map(self, previous, codes, powerups, js):
+        # Start from the previous state's map and only replace the cells that
+        # changed. Unchanged Cell objects are shared with the previous state,
+        # so neither should be played on while the other is still in use.
+        # Returns False if the deep space layout differs.
+        old_types = previous.grid.types
+        if (codes.translate(_LAYOUT_TABLE) !=
+                old_types.translate(_LAYOUT_TABLE)):
+            return False
+
+        grid = self.grid
+        grid.types[:] = codes
+        for pos in powerups:
+            grid.powerups[grid.index(pos)] = 1
+
+        new_map = dict(previous.map)
+        changed = dict()
+        replaced = set()
+        keys = self.zobrist
+        h = previous.map_hash
+
+        if codes != old_types:
+            positions = grid.all_positions
+            for i, (code, old) in enumerate(zip(codes, old_types)):
+                if code != old:
+                    h ^= keys.cells[old][i] ^ keys.cells[code][i]
+                    pos = positions[i]
+                    changed[pos] = CODE_TYPES[old]
+                    c = Cell(pos[0], pos[1], CODE_TYPES[code])
+                    if grid.powerups[i]:
+                        c.powerup = True
+                    new_map[pos] = c
+                    replaced.add(pos)
+
+        # Powerups that appeared or were picked up
+        if grid.powerups != previous.grid.powerups:
+            for i, (new, old) in enumerate(zip(grid.powerups,
+                                               previous.grid.powerups)):
+                if new != old:
+                    h ^= keys.powerups[i]
+                    pos = grid.position(i)
+                    if pos not in replaced:
+                        cell = new_map[pos]
+                        new_map[pos] = Cell(pos[0], pos[1], cell.type)
+                        replaced.add(pos)
+                    new_map[pos].powerup = True if new else None
+
+        # Cells that held the previous worms point at them, and cells about
+        # to hold the new worms would point the previous state's cells at
+        # them, so both get their own copies
+        occupied = [w.position for w in previous.own_worms +
+                    previous.opponent_worms if w.alive]
+        for js_player in [js["myPlayer"]] + js["opponents"]:
+            for js_worm in js_player["worms"]:
+                if js_worm["health"] > 0:
+                    occupied.append((js_worm["position"]["x"],
+                                     js_worm["position"]["y"]))
+        for pos in occupied:
+            if pos not in replaced:
+                old = new_map[pos]
+                c = Cell(old.x, old.y, old.type)
+                c.powerup = old.powerup
+                new_map[pos] = c
+                replaced.add(pos)
+
+        self.map = new_map
+        self.map_hash = h
+        self.geometry = previous.geometry
+        self.changed_cells = changed
+        self.changed_since = previous.round
+        return True
+
+    def zobrist_hash(self):
+        # The map part is kept up to date as cells change; the worm and turn
+        # parts are a few XORs each, so they are added on demand and can't
+        # go stale when history.update_state edits worms directly
+        keys = self.zobrist
+        index = self.grid.index
+        h = self.map_hash ^ keys.turn(self.current_worm_id,
+                                      self.opp_current_worm_id,
+                                      self.selects_remaining,
+                                      self.opp_selects_remaining)
+        for worm in self.own_worms + self.opponent_worms:
+            h ^= keys.worm(worm_slot(worm), index(worm.position), worm.health,
+                           worm.bananas, worm.snowballs,
+                           worm.rounds_until_unfrozen)
+        return h
+
+    def _update_turn_order(self):
+        for worm in self.own_worms + self.opponent_worms:
+            self._set_attr(worm, "active_before_next_turn", False)
+            self._set_attr(worm, "turns_till_active", None)
 
         own_living_worms = sum(1 for worm in self.own_worms if worm.alive)
         opp_active = self.opp_current_worm_id
@@ -176,9 +451,10 @@ class State:
         for r in range(own_living_worms):
 
             if self.opponent_worms[opp_active].rounds_until_unfrozen <= r:
-                self.opponent_worms[opp_active].active_before_next_turn = True
+                self._set_attr(self.opponent_worms[opp_active],
+                               "active_before_next_turn", True)
 
-            self.own_worms[own_active].turns_till_active = r
+            self._set_attr(self.own_worms[own_active], "turns_till_active", r)
 
             # Select next opponent active worm
             for i in range(3):
@@ -191,3 +467,284 @@ class State:
                 own_active = (own_active + 1) % 3
                 if self.own_worms[own_active].alive:
                     break
+
+    # Make/unmake moves. apply() plays one command and play() resolves a
+    # whole round of simultaneous commands; undo() reverts the last of
+    # either. Each change to the state goes through one of the _set methods
+    # below, which log how to reverse it. Commands are assumed to be valid.
+
+    def apply(self, move, worm=None):
+        if worm is None:
+            worm = move.select if move.select is not None else self.current_worm
+
+        self._begin()
+        if move.select is not None:
+            self._select(move.select)
+        self._command(move, worm)
+
+    def play(self, own_move, opp_move):
+        self._begin()
+
+        commands = []
+        for move, current in ((own_move, self.current_worm),
+                              (opp_move, self.opp_current_worm)):
+            if move.select is not None:
+                self._select(move.select)
+                current = move.select
+            if current.rounds_until_unfrozen > 0:
+                move = Move(MoveType.NOTHING)
+            commands.append((move, current))
+
+        frozen = [w for w in self.own_worms + self.opponent_worms
+                  if w.rounds_until_unfrozen > 0]
+
+        (own_move, own_worm), (opp_move, opp_worm) = commands
+        if (own_move.move_type == MoveType.MOVE and
+                opp_move.move_type == MoveType.MOVE and
+                own_move.target == opp_move.target):
+            # Both worms bounce off each other
+            self._hurt(own_worm, PUSHBACK_DAMAGE)
+            self._hurt(opp_worm, PUSHBACK_DAMAGE)
+            commands = []
+
+        # Engine order: moves, digs, then attacks
+        for move_types in ((MoveType.MOVE,), (MoveType.DIG,),
+                           (MoveType.SHOOT, MoveType.BANANA,
+                            MoveType.SNOWBALL)):
+            for move, worm in commands:
+                if move.move_type in move_types:
+                    self._command(move, worm)
+
+        for worm in self.own_worms + self.opponent_worms:
+            if worm.alive and self.map[worm.position].type == CellType.LAVA:
+                self._hurt(worm, LAVA_DAMAGE)
+        for worm in frozen:
+            self._set_attr(worm, "rounds_until_unfrozen",
+                           worm.rounds_until_unfrozen - 1)
+
+        self._set_attr(self, "round", self.round + 1)
+        self._make_current(_next_worm(self.own_worms, self.current_worm))
+        self._make_current(_next_worm(self.opponent_worms,
+                                      self.opp_current_worm))
+        self._update_turn_order()
+
+        radius = lava_radius(self.round, self.grid.size)
+        if radius is not None:
+            # Only the cells outside the radius that aren't lava yet
+            lava = int(self.grid.types.translate(_LAVA_DIGITS)[::-1], 2)
+            spread = geometry.for_state(self).outside(radius ** 2) & ~lava
+            positions = self.grid.all_positions
+            while spread:
+                lowest = spread & -spread
+                self._set_type(positions[lowest.bit_length() - 1],
+                               CellType.LAVA)
+                spread ^= lowest
+
+    def undo(self):
+        log, analysis = self._frames.pop()
+        for change in reversed(log):
+            setter, args = change[0], change[1:]
+            setter(*args, log=False)
+        self.analysis = analysis
+
+    def commit(self):
+        # Forget the undo history, keeping the state as it is
+        self._frames = []
+
+    def valid(self, move, worm=None):
+        if move.select is not None:
+            worm = move.select
+            if worm.player == Player.SELF:
+                selects = self.selects_remaining
+            else:
+                selects = self.opp_selects_remaining
+            if selects <= 0 or not worm.alive:
+                return False
+        elif worm is None:
+            worm = self.current_worm
+
+        if move.move_type == MoveType.NOTHING:
+            return move.target is None
+        if move.move_type == MoveType.SHOOT:
+            return isinstance(move.target, Direction)
+        if move.target not in self.map:
+            return False
+
+        x, y = worm.position
+        target_x, target_y = move.target
+        cell = self.map[move.target]
+
+        if move.move_type in (MoveType.MOVE, MoveType.DIG):
+            if max(abs(target_x - x), abs(target_y - y)) != 1:
+                return False
+            if move.move_type == MoveType.DIG:
+                return cell.type == CellType.DIRT
+            return (cell.type in (CellType.AIR, CellType.LAVA) and
+                    cell.worm is None)
+
+        if (target_x - x) ** 2 + (target_y - y) ** 2 >= (THROW_RANGE + 1) ** 2:
+            return False
+        if move.move_type == MoveType.BANANA:
+            return worm.bananas > 0
+        if move.move_type == MoveType.SNOWBALL:
+            return worm.snowballs > 0
+        return False
+
+    def _begin(self):
+        self._frames.append(([], self.analysis))
+        self.analysis = AnalysisCache()
+
+    def _command(self, move, worm):
+        if move.move_type == MoveType.MOVE:
+            self._set_position(worm, move.target)
+            self._award(worm, POINTS_MOVE)
+            if self.map[move.target].powerup:
+                self._set_powerup(move.target, None)
+                self._set_health(worm, worm.health + HEALTH_PACK)
+                self._award(worm, POINTS_POWERUP)
+
+        elif move.move_type == MoveType.DIG:
+            if self.map[move.target].type == CellType.DIRT:
+                self._set_type(move.target, CellType.AIR)
+                self._award(worm, POINTS_DIG)
+
+        elif move.move_type == MoveType.SHOOT:
+            ray = geometry.for_state(self).rays[worm.position][move.target]
+            for pos in ray:
+                cell = self.map[pos]
+                if cell.type != CellType.AIR:
+                    break
+                if cell.worm is not None:
+                    self._hurt(cell.worm, GUN_DAMAGE, worm)
+                    break
+            else:
+                self._award(worm, POINTS_MISSED_SHOT)
+
+        elif move.move_type == MoveType.BANANA:
+            self._set_attr(worm, "bananas", worm.bananas - 1)
+            x, y = move.target
+            for (dx, dy), damage in BANANA_DAMAGE.items():
+                pos = (x + dx, y + dy)
+                if pos in self.map:
+                    cell = self.map[pos]
+                    if cell.worm is not None:
+                        self._hurt(cell.worm, damage, worm)
+                    if cell.type == CellType.DIRT:
+                        self._set_type(pos, CellType.AIR)
+                        self._award(worm, POINTS_DIG)
+
+        elif move.move_type == MoveType.SNOWBALL:
+            self._set_attr(worm, "snowballs", worm.snowballs - 1)
+            x, y = move.target
+            for dx, dy in SNOWBALL_DELTAS:
+                pos = (x + dx, y + dy)
+                if pos in self.map and self.map[pos].worm is not None:
+                    target = self.map[pos].worm
+                    self._set_attr(target, "rounds_until_unfrozen",
+                                   FREEZE_DURATION)
+                    if target.player != worm.player:
+                        self._award(worm, POINTS_FREEZE)
+                    else:
+                        self._award(worm, -POINTS_FREEZE)
+
+    def _hurt(self, worm, damage, attacker=None):
+        was_alive = worm.alive
+        self._set_health(worm, worm.health - damage)
+        if attacker is None:
+            return
+        points = 2 * damage
+        if was_alive and not worm.alive:
+            points += POINTS_KILL
+        if worm.player == attacker.player:
+            points = -points
+        self._award(attacker, points)
+
+    def _award(self, worm, points):
+        if worm.player == Player.SELF:
+            self._set_attr(self, "own_score", self.own_score + points)
+        else:
+            self._set_attr(self, "opp_score", self.opp_score + points)
+
+    def _log(self, *change):
+        if self._frames:
+            self._frames[-1][0].append(change)
+
+    def _set_type(self, pos, cell_type, log=True):
+        cell = self.map[pos]
+        if log:
+            self._log(self._set_type, pos, cell.type)
+        cell.type = cell_type
+        i = self.grid.index(pos)
+        cells = self.zobrist.cells
+        self.map_hash ^= cells[self.grid.types[i]][i]
+        self.grid.types[i] = TYPE_CODES[cell_type]
+        self.map_hash ^= cells[self.grid.types[i]][i]
+
+    def _set_powerup(self, pos, powerup, log=True):
+        cell = self.map[pos]
+        if log:
+            self._log(self._set_powerup, pos, cell.powerup)
+        cell.powerup = powerup
+        i = self.grid.index(pos)
+        if self.grid.powerups[i] != (1 if powerup else 0):
+            self.map_hash ^= self.zobrist.powerups[i]
+        self.grid.powerups[i] = 1 if powerup else 0
+
+    def _set_position(self, worm, pos, log=True):
+        if log:
+            self._log(self._set_position, worm, worm.position)
+        if worm.alive:
+            self.map[worm.position].worm = None
+            self.grid.remove_worm(worm)
+        worm.x, worm.y = pos
+        worm.position = pos
+        if worm.alive:
+            self.map[pos].worm = worm
+            self.grid.place_worm(worm)
+
+    def _set_health(self, worm, health, log=True):
+        if log:
+            self._log(self._set_health, worm, worm.health)
+        was_alive = worm.alive
+        worm.health = health
+        worm.alive = health > 0
+        if was_alive and not worm.alive:
+            self.map[worm.position].worm = None
+            self.grid.remove_worm(worm)
+        elif worm.alive and not was_alive:
+            self.map[worm.position].worm = worm
+            self.grid.place_worm(worm)
+
+    def _set_attr(self, obj, name, value, log=True):
+        if log:
+            self._log(self._set_attr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+    def _select(self, worm):
+        if worm.player == Player.SELF:
+            self._set_attr(self, "selects_remaining",
+                           self.selects_remaining - 1)
+        else:
+            self._set_attr(self, "opp_selects_remaining",
+                           self.opp_selects_remaining - 1)
+        self._make_current(worm)
+
+    def _make_current(self, worm):
+        if worm.player == Player.SELF:
+            self._set_attr(self.current_worm, "active", False)
+            self._set_attr(self, "current_worm", worm)
+            self._set_attr(self, "current_worm_id", worm.id)
+        else:
+            self._set_attr(self.opp_current_worm, "active", False)
+            self._set_attr(self, "opp_current_worm", worm)
+            self._set_attr(self, "opp_current_worm_id", worm.id)
+        self._set_attr(worm, "active", True)
+
+
+def _next_worm(worms, current):
+    # The next living worm after current, in id order
+    for i in range(1, len(worms) + 1):
+        worm = worms[(current.id + i) % len(worms)]
+        if worm.alive:
+            return worm
+    return current
@@ -0,0 +1,92 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from state import Player, DIRT
+from rules import BANANA_DAMAGE, SNOWBALL_DELTAS
+import geometry
+
+
+class Targets:
+
+    # Banana and snowball scores for every cell a worm can throw at.
+    #
+    # Damage and hit grids come from blast_grids, and dirt is convolved only
+    # over the cells in the thrower's precomputed throwing range. Candidate
+    # lists are in map order, so ranking them with stable sorts gives the
+    # same ties as scanning state.map.
+
+    def __init__(self, state, thrower):
+        grid = state.grid
+        size = grid.size
+        own_damage, opp_damage, own_hits, opp_hits = blast_grids(state)
+
+        self.banana = []
+        self.banana_dig = []
+        self.snowball = []
+
+        types = grid.types
+        for pos in geometry.for_state(state).throw_range[thrower.position]:
+            x, y = pos
+            i = y * size + x
+
+            if own_damage[i] == 0:
+                if opp_damage[i] > 0:
+                    self.banana.append((pos, opp_damage[i]))
+
+                digs = 0
+                for bx, by in BANANA_DAMAGE:
+                    if grid.in_map((x + bx, y + by)):
+                        if types[(y + by) * size + x + bx] == DIRT:
+                            digs += 1
+                if digs > 0:
+                    self.banana_dig.append((pos, digs))
+
+            if own_hits[i] == 0 and opp_hits[i] > 0:
+                worm = grid.slots[grid.worms[i]]
+                has_worm = int(worm is not None and
+                               worm.player == Player.OPPONENT)
+                self.snowball.append((pos, opp_hits[i], has_worm))
+
+
+def blast_grids(state):
+    # Banana damage to own and opponent worms and snowball hits on them, by
+    # the index of the cell thrown at. The blast kernels are stamped around
+    # each worm (they are symmetric, so this is the same as convolving the
+    # occupancy grid) once per state and shared by every thrower.
+    def compute():
+        grid = state.grid
+        n = grid.size * grid.size
+
+        own_damage = [0] * n
+        opp_damage = [0] * n
+        own_hits = [0] * n
+        opp_hits = [0] * n
+
+        for worm in grid.slots:
+            if worm is None:
+                continue
+            x, y = worm.position
+            if worm.player == Player.SELF:
+                damage_grid = own_damage
+                hit_grid = own_hits
+            else:
+                damage_grid = opp_damage
+                # Frozen opponents aren't worth another snowball
+                hit_grid = opp_hits if worm.rounds_until_unfrozen == 0 else None
+
+            for (dx, dy), damage in BANANA_DAMAGE.items():
+                pos = (x - dx, y - dy)
+                if grid.in_map(pos):
+                    damage_grid[grid.index(pos)] += damage
+
+            if hit_grid is not None:
+                for dx, dy in SNOWBALL_DELTAS:
+                    pos = (x - dx, y - dy)
+                    if grid.in_map(pos):
+                        hit_grid[grid.index(pos)] += 1
+
+        return own_damage, opp_damage, own_hits, opp_hits
+
+    return state.analysis.get(("blast_grids",), compute)
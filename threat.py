@@ -0,0 +1,162 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+from collections import defaultdict
+
+from state import MoveType, CellType, Player, AIR, worm_slot
+import bitboard
+import geometry
+
+
+class ThreatField:
+
+    # What every worm could hit next turn, as seen by one moving worm (the
+    # subject). The subject never blocks a shot because it is about to move.
+    #
+    # sources maps a cell to the (worm slot, weapon) pairs of living
+    # opponents that reach it, and dug_sources maps a dirt cell to the extra
+    # gun cells that open up if it is dug, so queries about a cell don't need
+    # to walk any rays. Banana and snowball reach comes from the per-match
+    # geometry's reverse index, so checking them is a bit test per opponent.
+
+    def __init__(self, state, subject):
+        geo = geometry.for_state(state)
+        self.geometry = geo
+
+        # The subject is about to move, so it doesn't block shots unless it
+        # is standing on something that would anyway
+        grid = state.grid
+        blocking = bitboard.for_state(state).blocking
+        subject_index = grid.index(subject.position)
+        if subject.alive and grid.types[subject_index] == AIR:
+            blocking &= ~(1 << subject_index)
+
+        self.rays = dict()
+        self.positions = dict()
+        self.bananas = dict()
+        self.sources = defaultdict(list)
+        self.dug_sources = defaultdict(list)
+        self.throwers = []
+
+        for worm in state.own_worms + state.opponent_worms:
+            slot = worm_slot(worm)
+            self.positions[slot] = worm.position
+            self.bananas[slot] = worm.bananas > 0
+            track = worm.alive and worm.player == Player.OPPONENT
+
+            rays = []
+            for (direction, ray), (_, mask, increasing) in zip(
+                    geo.rays[worm.position].items(),
+                    geo.ray_masks(worm.position)):
+                visible, extension = _walk(state, ray, mask, increasing,
+                                           blocking, subject)
+                rays.append((direction, visible, extension))
+                if track:
+                    for pos in visible:
+                        self.sources[pos].append((slot, MoveType.SHOOT))
+                    if extension:
+                        self.dug_sources[extension[0]].append((slot, extension))
+            self.rays[slot] = rays
+
+            # Throwers as (slot, weapon, bit of the thrower's cell, index
+            # into geo.reach)
+            bit = 1 << grid.index(worm.position)
+            if track and worm.bananas > 0:
+                self.throwers.append((slot, MoveType.BANANA, bit, 1))
+            if track and worm.snowballs > 0:
+                self.throwers.append((slot, MoveType.SNOWBALL, bit, 2))
+
+    def cells(self, slot, dug=None, directions=None, include_banana=True):
+        # Cells the worm can shoot or banana, with dug treated as air
+        shootable = []
+        for direction, visible, extension in self.rays[slot]:
+            if directions is None or direction in directions:
+                shootable += visible
+                if extension and extension[0] == dug:
+                    shootable += extension
+
+        if include_banana and self.bananas[slot]:
+            shootable += self.geometry.blast_area(self.positions[slot])
+
+        return shootable
+
+    def weapons(self, pos):
+        # (worm slot, weapon) pairs that reach pos
+        weapons = self.sources.get(pos, [])
+        if self.throwers:
+            reach = self.geometry.reach(pos)
+            weapons = weapons + [(slot, weapon)
+                                 for slot, weapon, bit, kind in self.throwers
+                                 if reach[kind] & bit]
+        return weapons
+
+    def threats(self, pos, slots, include_banana=True):
+        # Worms in slots that could shoot or banana pos
+        found = set()
+        for slot, weapon in self.weapons(pos):
+            if slot in slots:
+                if (weapon == MoveType.SHOOT or
+                        (weapon == MoveType.BANANA and include_banana)):
+                    found.add(slot)
+        return found
+
+    def threatened(self, pos, slots, dug=None, include_banana=True):
+        if self.threats(pos, slots, include_banana):
+            return True
+
+        if dug is not None:
+            for slot, extension in self.dug_sources.get(dug, ()):
+                if slot in slots and pos in extension:
+                    return True
+
+        return False
+
+    def count(self, pos, slots, weapons=(MoveType.SHOOT, MoveType.BANANA)):
+        return sum(1 for slot, weapon in self.weapons(pos)
+                   if slot in slots and weapon in weapons)
+
+    def threatened_cells(self):
+        cells = set(self.sources)
+        areas = {MoveType.BANANA: self.geometry.blast_area,
+                 MoveType.SNOWBALL: self.geometry.freeze_area}
+        for slot, weapon, _, _ in self.throwers:
+            cells.update(areas[weapon](self.positions[slot]))
+        return cells
+
+
+def _walk(state, ray, mask, increasing, blocking, subject):
+    # Cells a shot along ray reaches, and the cells beyond if the terrain
+    # blocking it were dug
+    i = bitboard.first_blocker(mask, blocking, increasing)
+    if i < 0:
+        return ray, ()
+
+    # Rays are straight lines, so the blocker's distance along the ray is
+    # the larger of its x and y distances from the start
+    grid = state.grid
+    x, y = grid.position(i)
+    start_x, start_y = ray[0]
+    step = max(abs(x - start_x), abs(y - start_y))
+    if grid.types[i] != AIR:
+        return ray[:step], _extend(state, ray[step:], subject)
+    return ray[:step], ()
+
+
+def _extend(state, ray, subject):
+    # ray starts at the dug cell, which doesn't block
+    for i, pos in enumerate(ray):
+        cell = state.map[pos]
+        if i > 0 and cell.type != CellType.AIR:
+            return ray[:i]
+        if cell.worm is not None and cell.worm != subject:
+            return ray[:i]
+    return ray
+
+
+def for_state(state, subject=None):
+    if subject is None:
+        subject = state.current_worm
+    return state.analysis.get(("threat", worm_slot(subject)),
+                              lambda: ThreatField(state, subject))
@@ -0,0 +1,155 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import argparse
+import ast
+import importlib.util
+import itertools
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from collections import defaultdict
+
+import simulator
+import stats
+
+
+# Variants loaded by this process, by spec
+_variants = dict()
+
+
+def load_variant(spec, name):
+    # spec is a module name or .py path, optionally followed by constant
+    # overrides: "bot:DAMAGE_MIN=15,BANANA_DIG_MINIMUM=6". Every variant gets
+    # its own copy of the module so overrides don't leak between variants.
+    source, _, overrides = spec.partition(":")
+    if source.endswith(".py"):
+        path = source
+    else:
+        path = importlib.util.find_spec(source).origin
+
+    module_spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+
+    # The endgame solver searches on the clock, so its moves depend on how
+    # busy the machine is. Variants only get it by asking: "bot:ENDGAME=True".
+    if hasattr(module, "ENDGAME"):
+        module.ENDGAME = False
+
+    for override in filter(None, overrides.split(",")):
+        key, value = override.split("=", 1)
+        if not hasattr(module, key):
+            raise ValueError(f"{source} has no constant {key}")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        setattr(module, key, value)
+
+    return module
+
+
+def _init_worker(specs):
+    logging.disable(logging.CRITICAL)
+    for i, spec in enumerate(specs):
+        _variants[spec] = load_variant(spec, f"variant_{i}")
+
+
+def _play(task):
+    # One match; first_spec plays the first player's side
+    first_spec, second_spec, seed = task
+    start = time.perf_counter()
+    result = simulator.play_match(_variants[first_spec],
+                                  _variants[second_spec], seed=seed)
+    return {
+        "first": first_spec,
+        "second": second_spec,
+        "seed": seed,
+        "winner": {"Self": first_spec, "Opponent": second_spec,
+                   None: None}[result["winner"]],
+        "rounds": result["rounds"],
+        "margin": result["own_score"] - result["opp_score"],
+        "first_latency": stats.summary(result["own_times"]),
+        "second_latency": stats.summary(result["opp_times"]),
+        "seconds": time.perf_counter() - start,
+    }, result["own_times"], result["opp_times"]
+
+
+def tasks(specs, matches, seed):
+    # Every pair plays matches games on the same seeds, swapping sides on
+    # alternate games
+    for a, b in itertools.combinations(specs, 2):
+        for i in range(matches):
+            if i % 2 == 0:
+                yield a, b, seed + i // 2
+            else:
+                yield b, a, seed + i // 2
+
+
+def summarise(records, times):
+    played = defaultdict(int)
+    wins = defaultdict(int)
+    draws = defaultdict(int)
+    margins = defaultdict(list)
+    for record in records:
+        for spec, sign in ((record["first"], 1), (record["second"], -1)):
+            played[spec] += 1
+            margins[spec].append(sign * record["margin"])
+            if record["winner"] == spec:
+                wins[spec] += 1
+            elif record["winner"] is None:
+                draws[spec] += 1
+
+    return [{
+        "variant": spec,
+        "matches": played[spec],
+        "win_rate": wins[spec] / played[spec],
+        "draws": draws[spec],
+        "mean_margin": sum(margins[spec]) / played[spec],
+        "latency": stats.summary(times[spec]),
+    } for spec in played]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play bot variants against each other in parallel")
+    parser.add_argument("variants", nargs="+",
+                        help="module or .py path, optionally with "
+                             ":NAME=value,... constant overrides")
+    parser.add_argument("--matches", type=int, default=10,
+                        help="matches per pair of variants")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--out", default="tournament.jsonl")
+    args = parser.parse_args()
+
+    if len(args.variants) < 2:
+        parser.error("need at least two variants")
+
+    records = []
+    times = defaultdict(list)
+    with open(args.out, "w") as out, multiprocessing.Pool(
+            args.processes, _init_worker, (args.variants,)) as pool:
+        for record, first_times, second_times in pool.imap_unordered(
+                _play, tasks(args.variants, args.matches, args.seed)):
+            records.append(record)
+            times[record["first"]] += first_times
+            times[record["second"]] += second_times
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            print(f"{len(records)}: {record['winner']} "
+                  f"({record['seconds']:.1f}s)", file=sys.stderr)
+
+        for line in summarise(records, times):
+            out.write(json.dumps(line) + "\n")
+            print(json.dumps(line))
+
+
+if __name__ == "__main__":
+    main()
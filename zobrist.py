@@ -0,0 +1,78 @@
+# Worms Bot
+# Entelect Challenge 2019
+# Mallin Moolman
+
+
+import random
+
+
+# Worm values outside these ranges are clamped into them
+HEALTH_MIN = -64
+HEALTH_MAX = 255
+COUNT_MAX = 15
+
+_tables = dict()
+
+
+class Keys:
+
+    # Random 64 bit keys for one map size. A position's hash is the XOR of
+    # the keys of everything in it, so changing one thing is two XORs. The
+    # generator is seeded by the size, so hashes agree between runs.
+
+    def __init__(self, size):
+        rng = random.Random(size)
+        n = size * size
+
+        def keys(count):
+            return [rng.getrandbits(64) for _ in range(count)]
+
+        # Cell type keys by code, then index
+        self.cells = [keys(n) for _ in range(4)]
+        self.powerups = keys(n)
+
+        # Worm keys by slot (1-6), then value
+        slots = range(7)
+        self.positions = [keys(n) for _ in slots]
+        self.health = [keys(HEALTH_MAX - HEALTH_MIN + 1) for _ in slots]
+        self.bananas = [keys(COUNT_MAX + 1) for _ in slots]
+        self.snowballs = [keys(COUNT_MAX + 1) for _ in slots]
+        self.frozen = [keys(COUNT_MAX + 1) for _ in slots]
+
+        # Turn keys: each player's current worm and remaining selects
+        self.current = keys(3)
+        self.opp_current = keys(3)
+        self.selects = keys(COUNT_MAX + 1)
+        self.opp_selects = keys(COUNT_MAX + 1)
+
+    def map_hash(self, types, powerups):
+        h = 0
+        for i, code in enumerate(types):
+            h ^= self.cells[code][i]
+        for i, powerup in enumerate(powerups):
+            if powerup:
+                h ^= self.powerups[i]
+        return h
+
+    def worm(self, slot, index, health, bananas, snowballs, frozen):
+        health = min(max(health, HEALTH_MIN), HEALTH_MAX) - HEALTH_MIN
+        return (self.positions[slot][index] ^ self.health[slot][health] ^
+                self.bananas[slot][_count(bananas)] ^
+                self.snowballs[slot][_count(snowballs)] ^
+                self.frozen[slot][_count(frozen)])
+
+    def turn(self, current, opp_current, selects, opp_selects):
+        return (self.current[current] ^ self.opp_current[opp_current] ^
+                self.selects[_count(selects)] ^
+                self.opp_selects[_count(opp_selects)])
+
+
+def _count(value):
+    return min(max(value, 0), COUNT_MAX)
+
+
+def for_size(size):
+    keys = _tables.get(size)
+    if keys is None:
+        keys = _tables[size] = Keys(size)
+    return keys